@@ -1,34 +1,67 @@
+import time
+# Start of the startup timeline, taken before pygame and NumPy load
+STARTED = time.perf_counter()
+
 import pygame
+import argparse
 import sys
-import random
-import time
+import gc
 import os
-import urllib.request
+from itertools import repeat
 from pygame.locals import *
 
-# Initialize pygame
-pygame.init()
+import numpy as np
 
-# Get the user's screen info for responsive design
-screen_info = pygame.display.Info()
-USER_SCREEN_WIDTH = screen_info.current_w
-USER_SCREEN_HEIGHT = screen_info.current_h
+import savestate
+import snapshot
+import starfield
+from assets import AssetCache
+from netplay import GameClient, parse_address
+from particles import ParticleSystem
+from prefetch import Prefetch, asset_path
+from profiler import FrameProfiler, StartupTimeline
+from replay import InputRecorder
+from waves import WaveScript
+from scores import ScoreStore, run_entry
+from sprites import load_sprites, sprite_masks
+from render import (DirtyRectRenderer, Interpolator, QualityGovernor, QualityTier, ResizePipeline, SpriteAtlas,
+                    TextCache)
+from simulation import (GameConfig, Simulation, MENU, GAME, GAME_OVER, VICTORY,
+                        ACTION_LEFT, ACTION_RIGHT, ACTION_FIRE, POWERUP_TYPES)
 
-# Set game dimensions based on screen size (responsive)
-# Use 80% of screen size or fallback to standard size if detection fails
-try:
-    SCREEN_WIDTH = min(int(USER_SCREEN_WIDTH * 0.8), 1600)
-    SCREEN_HEIGHT = min(int(USER_SCREEN_HEIGHT * 0.8), 900)
-except:
-    SCREEN_WIDTH = 800
-    SCREEN_HEIGHT = 600
+# Window size, set by Game once the display is up (importing this module opens nothing)
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
 
 # Scale factor for responsive elements (based on reference resolution of 800x600)
 SCALE_X = SCREEN_WIDTH / 800
 SCALE_Y = SCREEN_HEIGHT / 600
 
-# Function to scale values based on screen size
-def scale_value(value, is_horizontal=True):
+# Sprite images packed into the atlas
+SPRITE_NAMES = ('player_img', 'enemy_img_10', 'enemy_img_30', 'enemy_img_50', 'bullet_img',
+                'powerup_img', 'heart_powerup_img', 'heart_full', 'heart_empty')
+
+# How long the loop sleeps waiting for input on a static screen (ms)
+IDLE_WAIT_MS = 1000
+
+# Longest frame the simulation catches up on (seconds); beyond that the game slows down
+MAX_FRAME_TIME = 0.25
+
+# Quick save slot (F5 saves, F9 resumes) and how far Backspace rewinds (seconds)
+SAVE_PATH = 'savegame.sav'
+REWIND_SECONDS = 5
+
+def desktop_window_size():
+    """80% of the user's screen, at most 1600x900; 800x600 if the screen size is unknown"""
+    screen_info = pygame.display.Info()
+    if screen_info.current_w <= 0 or screen_info.current_h <= 0:
+        return 800, 600
+    return min(int(screen_info.current_w * 0.8), 1600), min(int(screen_info.current_h * 0.8), 900)
+
+# Function to scale values based on screen size (or an explicit (width, height))
+def scale_value(value, is_horizontal=True, size=None):
+    if size is not None:
+        return int(value * (size[0] / 800 if is_horizontal else size[1] / 600))
     return int(value * (SCALE_X if is_horizontal else SCALE_Y))
 
 # Colors
@@ -45,288 +78,319 @@ BRIGHT_YELLOW = (255, 255, 0)
 NEON_PINK = (255, 20, 147)
 DEEP_BLUE = (0, 0, 100)
 
-# Game states
-MENU = 0
-GAME = 1
-GAME_OVER = 2
-VICTORY = 3
-
-# Create images directory if it doesn't exist
-if not os.path.exists('game_images'):
-    os.makedirs('game_images')
-
-# Function to download images
-def download_image(url, filename):
-    if not os.path.exists(f'game_images/{filename}'):
-        try:
-            urllib.request.urlretrieve(url, f'game_images/{filename}')
-            print(f"Downloaded {filename}")
-        except Exception as e:
-            print(f"Failed to download {filename}: {e}")
-            return False
-    return True
+# Particle palette: enemy explosions by points, hits, powerup pickups and the engine trail
+PARTICLE_COLORS = {10: RED, 30: ORANGE, 50: NEON_PINK, 'player_hit': WHITE, 'speed': CYAN,
+                   'rapid_fire': BRIGHT_YELLOW, 'heart': NEON_PINK, 'trail': GOLD}
+PARTICLE_INDEX = {name: i for i, name in enumerate(PARTICLE_COLORS)}
 
-# Download necessary images
-image_urls = {
-    'spaceship': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/player.png',
-    'alien1': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/red.png',
-    'alien2': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/green.png',
-    'alien3': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/yellow.png',
-    'bullet': 'https://cdn-icons-png.flaticon.com/512/5610/5610944.png',
-    'background': 'https://img.freepik.com/premium-vector/space-game-background-neon-night-alien-landscape_107791-1624.jpg',
-    'powerup': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/extra.png',
-    'heart_powerup': 'https://cdn-icons-png.flaticon.com/512/833/833472.png'
-}
-
-for name, url in image_urls.items():
-    download_image(url, f"{name}.png")
+# Quality tiers, best first, for --quality and for the governor that picks
+# one to hold the frame rate: internal resolution (fraction of the window),
+# background detail, particle limit and hard-edged sprites
+QUALITY_TIERS = [
+    QualityTier('high'),
+    QualityTier('medium', 1.0, 'full', 1024, True),
+    QualityTier('low', 0.75, 'sparse', 512, True),
+    QualityTier('lowest', 0.5, 'plain', 0, True),
+]
+QUALITY_NAMES = [tier.name for tier in QUALITY_TIERS]
 
 class Game:
-    def __init__(self):
+    def __init__(self, profile_path=None, record_dir=None, tick_rate=60, fps=60, vsync=False, waves=None,
+                 connect=None, spectate=False, prefetch=True, startup_budget=None, quality='auto'):
+        global SCREEN_WIDTH, SCREEN_HEIGHT, SCALE_X, SCALE_Y
+        # Time from process start to the first frame, step by step
+        self.startup = StartupTimeline(STARTED)
+        self.startup_budget = startup_budget  # ms to the first frame; reported and enforced when set
+        self.startup.mark('imports')
+        
+        # Missing images and the font download in the background once the
+        # first frame is up; the game draws built-in stand-ins until they
+        # arrive and never waits for them
+        self.prefetch_assets = prefetch
+        self.prefetch = None
+        
+        # Only the subsystems the game uses, started when a game is created
+        pygame.display.init()
+        pygame.font.init()
+        
+        # Quality is a fixed tier, or picked by a governor that watches frame
+        # times; with vsync a frame always takes a whole refresh, so there is
+        # nothing for it to measure
+        tier = 0 if quality == 'auto' else QUALITY_NAMES.index(quality)
+        self.quality = QUALITY_TIERS[tier]
+        self.governor = None
+        if quality == 'auto' and not vsync:
+            self.governor = QualityGovernor(QUALITY_TIERS, 1 / (fps or 60), tier)
+        
         # Create a responsive window that can be resized
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
+        self.vsync = vsync
+        self.fps = fps  # Frame rate cap; 0 draws as fast as possible (or at the refresh rate with vsync)
+        self.last_window_size = desktop_window_size()
+        self.screen = self.set_display_mode(self.last_window_size)
         pygame.display.set_caption('Alien Invasion')
         self.clock = pygame.time.Clock()
+        # Everything is drawn at the quality tier's internal resolution
+        self.set_render_size(self.render_size(self.last_window_size))
+        self.startup.mark('display')
         
-        # Load custom gaming font
-        self.load_fonts()
+        # Rendered strings are cached until the fonts change
+        self.text = TextCache()
         
-        # Game variables
-        self.state = MENU
-        self.score = 0
-        self.high_score = self.load_high_score()
-        self.lives = 3
-        self.max_lives = 3  # Maximum number of lives
-        self.target_score = 250  # Player wins when reaching this score
-        
-        # Load images
-        self.load_images()
-        
-        # Create player
-        self.player = Player(self.player_img)
-        
-        # Create enemy group
-        self.enemies = pygame.sprite.Group()
-        self.bullets = pygame.sprite.Group()
-        self.powerups = pygame.sprite.Group()
-        
-        # Menu selection
-        self.menu_selection = 0
-        self.menu_options = ["New Game", "High Score", "Exit"]
-        
-        # Background
-        self.background = self.load_background()
-        self.menu_background = self.load_menu_background()
-        
-        # Handle window resize events
-        self.last_window_size = (SCREEN_WIDTH, SCREEN_HEIGHT)
-        
-    def load_fonts(self):
-        """Load custom gaming fonts or use system fonts as fallback"""
-        try:
-            # Try to download a gaming font if not already downloaded
-            font_url = "https://github.com/google/fonts/raw/main/ofl/pressstart2p/PressStart2P-Regular.ttf"
-            if not os.path.exists('game_images/game_font.ttf'):
-                try:
-                    urllib.request.urlretrieve(font_url, 'game_images/game_font.ttf')
-                    print("Downloaded game font")
-                except Exception as e:
-                    print(f"Failed to download font: {e}")
-            
-            # Load the custom font if available
-            if os.path.exists('game_images/game_font.ttf'):
-                base_size = scale_value(16, False)
-                self.font_large = pygame.font.Font('game_images/game_font.ttf', base_size * 2)
-                self.font_medium = pygame.font.Font('game_images/game_font.ttf', base_size)
-                self.font_small = pygame.font.Font('game_images/game_font.ttf', int(base_size * 0.75))
-            else:
-                raise FileNotFoundError("Custom font not found")
-        except:
-            # Fallback to system fonts
-            self.font_large = pygame.font.SysFont('Arial', scale_value(48, False))
-            self.font_medium = pygame.font.SysFont('Arial', scale_value(36, False))
-            self.font_small = pygame.font.SysFont('Arial', scale_value(24, False))
-            
-    def load_menu_background(self):
-        """Create a custom space background for the menu"""
-        # Create a custom space background
-        bg = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        bg.fill(BLACK)
-        
-        # Create a responsive starfield with more stars for menu
-        star_count = int((SCREEN_WIDTH * SCREEN_HEIGHT) / 1500)  # More stars for menu
-        for _ in range(star_count):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(0, SCREEN_HEIGHT)
-            radius = random.randint(1, 4)
-            color = random.choice([WHITE, CYAN, BRIGHT_YELLOW])
-            pygame.draw.circle(bg, color, (x, y), radius)
-            
-        # Add some nebula-like effects
-        for _ in range(20):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(0, SCREEN_HEIGHT)
-            radius = random.randint(50, 150)
-            color = random.choice([(20, 0, 40, 50), (0, 20, 40, 50), (40, 0, 20, 50)])
-            
-            # Create a surface with per-pixel alpha
-            nebula = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
-            pygame.draw.circle(nebula, color, (radius, radius), radius)
-            bg.blit(nebula, (x-radius, y-radius))
-            
-        # Add a planet
-        planet_radius = scale_value(80)
-        planet_x = SCREEN_WIDTH - planet_radius - scale_value(50)
-        planet_y = scale_value(100, False)
-        
-        # Draw planet
-        planet = pygame.Surface((planet_radius*2, planet_radius*2), pygame.SRCALPHA)
-        pygame.draw.circle(planet, (150, 100, 50), (planet_radius, planet_radius), planet_radius)
-        
-        # Add some details to the planet
-        for _ in range(15):
-            detail_x = random.randint(0, planet_radius*2)
-            detail_y = random.randint(0, planet_radius*2)
-            detail_radius = random.randint(5, 15)
-            distance = ((detail_x - planet_radius)**2 + (detail_y - planet_radius)**2)**0.5
-            if distance < planet_radius:
-                pygame.draw.circle(planet, (120, 80, 40), (detail_x, detail_y), detail_radius)
-        
-        bg.blit(planet, (planet_x - planet_radius, planet_y - planet_radius))
-        
-        return bg
+        # Menu and end screens are only redrawn when what they show changes
+        self.static_key = None
         
         # Game variables
         self.state = MENU
-        self.score = 0
-        self.high_score = self.load_high_score()
-        self.lives = 3
-        self.target_score = 200  # Player wins when reaching this score
-        
-        # Load images
-        self.load_images()
-        
-        # Create player
-        self.player = Player(self.player_img)
-        
-        # Create enemy group
-        self.enemies = pygame.sprite.Group()
-        self.bullets = pygame.sprite.Group()
-        self.powerups = pygame.sprite.Group()
+        # Leaderboard, saved in the background so a finished game never stalls a frame
+        self.scores = ScoreStore()
+        self.high_score = self.scores.high_score
+        
+        # Swarm mode puts thousands of sprites on screen; hard-edged sprites
+        # (a colorkey atlas) draw several times faster than alpha-blended ones
+        self.sprite_alpha_threshold = 128 if waves else None
+        
+        # Explosions, pickups and the engine trail; purely visual, kept out of the rules
+        self.particles = ParticleSystem(PARTICLE_COLORS.values())
+        self.particles.limit = self.quality.particles
+        
+        # Load fonts, images and backgrounds (scaled images are cached on disk)
+        self.assets = AssetCache()
+        surfaces = self.build_for_window(self.last_window_size)
+        self.startup.mark('assets')
+        self.apply_surfaces(surfaces)
+        self.startup.mark('convert')
+        
+        # Frame-time instrumentation; F3 toggles the overlay
+        self.profile_path = profile_path
+        # Only an exported profile needs every frame; the F3 overlay keeps a rolling window
+        self.profiler = FrameProfiler(enabled=profile_path is not None, keep_history=profile_path is not None)
+        self.show_profiler = False
+        self.profiler_lines = []
+        
+        # Network play: the game runs on a netplay server and the local
+        # simulation only mirrors the snapshots it sends
+        self.client = None
+        config = GameConfig(*self.last_window_size, tick_rate=tick_rate)
+        if connect:
+            self.client = GameClient(connect, 'spectator' if spectate else 'pilot')
+            if self.client.role != 'pilot' and not spectate:
+                print("The server already has a pilot; watching as a spectator")
+            # The server's rules at this window's size
+            width, height = self.last_window_size
+            config = GameConfig.from_dict(dict(self.client.config.to_dict(), width=width, height=height))
+        
+        # Game rules run headless; this class only renders and reads input.
+        # With a wave script (swarm mode) enemies stream in from the script
+        self.sim = Simulation(config, profiler=self.profiler, waves=WaveScript(waves) if waves else None,
+                              masks=self.masks)
+        self.fire_pressed = False
+        
+        # Frames are drawn between ticks, blending positions from the last two
+        self.interpolator = Interpolator()
+        
+        # Input-to-display latency: time of the first unhandled game key press,
+        # and whether a tick has used it yet
+        self.input_time = None
+        self.input_applied = False
+        
+        # Optional input recording, one replay file per finished game
+        self.record_dir = record_dir
+        self.recorder = InputRecorder()
+        
+        # The last few seconds of play, for rewinding while Backspace is held
+        self.rewind = savestate.RewindBuffer(REWIND_SECONDS, tick_rate)
+        
+        # Dirty-rectangle rendering for gameplay frames
+        self.renderer = DirtyRectRenderer()
         
         # Menu selection
         self.menu_selection = 0
-        self.menu_options = ["New Game", "High Score", "Exit"]
-        
-        # Background
-        self.background = self.load_background()
-        
-        # Handle window resize events
-        self.last_window_size = (SCREEN_WIDTH, SCREEN_HEIGHT)
-        
-    def handle_resize(self, new_width, new_height):
-        """Handle window resize events to make the game responsive"""
+        self.menu_options = ["Join Game" if self.client else "New Game", "High Score", "Exit"]
+        
+        # Handle window resize events: bursts are coalesced and the surfaces
+        # for the final size are rebuilt in the background
+        self.resizer = ResizePipeline(self.build_for_window)
+        self.resize_preview = None
+        self.startup.mark('ready')
+        
+    def set_display_mode(self, size):
+        """Open or resize the window, synchronized to the display refresh if requested"""
+        if self.vsync:
+            try:
+                # SDL only offers vsync for scaled or OpenGL windows
+                return pygame.display.set_mode(size, pygame.RESIZABLE | pygame.SCALED, vsync=1)
+            except pygame.error as e:
+                print(f"VSync unavailable: {e}")
+                self.vsync = False
+        return pygame.display.set_mode(size, pygame.RESIZABLE)
+        
+    def render_size(self, window_size):
+        """Internal resolution of the current quality tier for a window size"""
+        scale = self.quality.render_scale
+        return max(int(window_size[0] * scale), 1), max(int(window_size[1] * scale), 1)
+        
+    def set_render_size(self, size):
+        """Draw at size from now on: straight onto the window, or offscreen and scaled up to it"""
         global SCREEN_WIDTH, SCREEN_HEIGHT, SCALE_X, SCALE_Y
         
         # Update screen dimensions
-        SCREEN_WIDTH = max(new_width, 400)  # Minimum width
-        SCREEN_HEIGHT = max(new_height, 300)  # Minimum height
+        SCREEN_WIDTH, SCREEN_HEIGHT = size
         
         # Update scale factors
         SCALE_X = SCREEN_WIDTH / 800
         SCALE_Y = SCREEN_HEIGHT / 600
         
-        # Update the screen
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
-        
-        # Reload backgrounds to fit new dimensions
-        self.background = self.load_background()
-        self.menu_background = self.load_menu_background()
-        
-        # Update font sizes
-        self.load_fonts()
-        
-        # Reset player position
-        self.player.rect.centerx = SCREEN_WIDTH // 2
-        self.player.rect.bottom = SCREEN_HEIGHT - scale_value(10, False)
+        self.canvas = self.screen if size == self.screen.get_size() else pygame.Surface(size).convert()
+        # The simulation works in window pixels
+        self.draw_scale = (size[0] / self.last_window_size[0], size[1] / self.last_window_size[1])
+        
+    def set_quality(self, tier):
+        """Switch quality tier; True when the surfaces have to be rebuilt for it"""
+        previous, self.quality = self.quality, QUALITY_TIERS[tier]
+        self.particles.limit = self.quality.particles
+        return ((previous.render_scale, previous.background, previous.hard_sprites) !=
+                (self.quality.render_scale, self.quality.background, self.quality.hard_sprites))
+        
+    def build_for_window(self, size):
+        """build_surfaces at the current quality's internal resolution for a window size"""
+        render_size = self.render_size(size)
+        surfaces = self.build_surfaces(render_size)
+        # The rules run in window pixels, so masks come from sprites at the window's size
+        images = surfaces if render_size == size else load_sprites(size, self.assets)
+        surfaces['masks'] = sprite_masks(images)
+        return surfaces
+        
+    def build_surfaces(self, size):
+        """Create every size-dependent font and surface; safe to run off the main thread"""
+        surfaces = self.load_fonts(size)
+        surfaces.update(self.load_images(size))
+        surfaces['background'] = self.load_background(size)
+        surfaces['menu_background'] = self.load_menu_background(size)
+        return surfaces
+        
+    def apply_surfaces(self, surfaces):
+        """Swap in surfaces from build_surfaces, converted to the display format"""
+        for name, value in surfaces.items():
+            if isinstance(value, pygame.Surface):
+                if value.get_flags() & pygame.SRCALPHA:
+                    value = value.convert_alpha()
+                else:
+                    value = value.convert()
+            setattr(self, name, value)
+            
+        # Sprites are drawn from one atlas built from the converted images
+        if 'player_img' in surfaces:
+            threshold = self.sprite_alpha_threshold
+            if threshold is None and self.quality.hard_sprites:
+                threshold = 128
+            self.atlas = SpriteAtlas({name: getattr(self, name) for name in SPRITE_NAMES}, alpha_threshold=threshold)
+            # Particles grow with the sprites
+            self.particles.build(max(scale_value(4, False), 2))
+
+        # Text rendered with the old fonts is no longer valid
+        self.text.clear()
+        self.static_key = None
+        
+    def load_fonts(self, size):
+        """The downloaded gaming font if there is one, else the font bundled with pygame"""
+        font_path = asset_path('game_font.ttf')
+        if os.path.exists(font_path):
+            try:
+                base_size = scale_value(16, False, size)
+                return {
+                    'font_large': pygame.font.Font(font_path, base_size * 2),
+                    'font_medium': pygame.font.Font(font_path, base_size),
+                    'font_small': pygame.font.Font(font_path, int(base_size * 0.75)),
+                }
+            except (OSError, pygame.error) as e:
+                print(f"Failed to load {font_path}: {e}")
+        
+        # Needs neither the network nor a system font lookup
+        return {
+            'font_large': pygame.font.Font(None, scale_value(48, False, size)),
+            'font_medium': pygame.font.Font(None, scale_value(36, False, size)),
+            'font_small': pygame.font.Font(None, scale_value(24, False, size)),
+        }
+            
+    def load_menu_background(self, size):
+        """Create a custom space background for the menu (stars, nebulae and a planet)"""
+        return starfield.menu_background(size)
+        
+    def begin_resize(self, new_width, new_height):
+        """Start or extend a window resize; the real rebuild waits until the drag settles"""
+        # Keep the last full frame to show scaled while the user drags
+        if self.resize_preview is None:
+            self.resize_preview = self.screen.copy()
+        self.screen = pygame.display.get_surface()
+        self.resizer.request((max(new_width, 400), max(new_height, 300)))  # Minimum size
+        
+    def handle_resize(self, size, surfaces):
+        """Switch to a new window size, or to surfaces rebuilt for the same one, once they are built"""
+        # Same window (new assets or another quality tier): only the surfaces change
+        resized = size != self.last_window_size or self.resize_preview is not None
+        if resized:
+            # Update the screen
+            self.screen = self.set_display_mode(size)
+            self.last_window_size = size
+            self.resize_preview = None
+        
+        # Backgrounds, fonts and sprites were built for the internal resolution
+        self.set_render_size(surfaces['background'].get_size())
+        
+        # The whole window has to be repainted
+        self.renderer.invalidate()
+        
+        # Swap in backgrounds, fonts and sprites built for the new size
+        self.apply_surfaces(surfaces)
+        self.use_masks(self.masks)
+        # Particles are kept in drawing coordinates
+        self.particles.clear()
+        if self.governor is not None:
+            self.governor.reset()
+        if not resized:
+            return
+        
+        # Rescale the playfield and reset player position
+        self.sim.resize(*size)
+        self.recorder.resize(*size)
+        self.interpolator.clear()
+        # Rewinding across a resize would bring back the old playfield size
+        self.rewind.clear()
+        
+    def use_masks(self, masks):
+        """Collide with new sprite masks from the next tick on, if they differ from the current ones"""
+        if self.sim.masks is not None and masks.to_dict() == self.sim.masks.to_dict():
+            return
+        self.sim.masks = masks
+        self.recorder.masks(masks)
+        # Rewound ticks would be played again with different masks
+        self.rewind.clear()
+        
+    def draw_resize_preview(self):
+        """Cheap stand-in frame while the window is being resized"""
+        pygame.transform.scale(self.resize_preview, self.screen.get_size(), self.screen)
+        pygame.display.flip()
         
-    def load_background(self):
-        try:
-            bg = pygame.image.load('game_images/background.png').convert()
-            bg = pygame.transform.scale(bg, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            return bg
-        except:
-            # Fallback to a simple background
-            bg = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            bg.fill(BLACK)
-            
-            # Create a responsive starfield
-            star_count = int((SCREEN_WIDTH * SCREEN_HEIGHT) / 5000)  # Adjust star density based on screen size
-            for _ in range(star_count):
-                x = random.randint(0, SCREEN_WIDTH)
-                y = random.randint(0, SCREEN_HEIGHT)
-                radius = random.randint(1, 3)
-                pygame.draw.circle(bg, WHITE, (x, y), radius)
+    def load_background(self, size):
+        detail = self.quality.background
+        if detail == 'plain':
+            return pygame.Surface(size)
+        # Scaled backgrounds are cached on disk per window size
+        bg = self.assets.load('background', asset_path('background.png'), size, alpha=False) if detail == 'full' else None
+        if bg:
             return bg
+        else:
+            # Fallback to a simple starfield
+            return starfield.game_background(size)
         
-    def load_images(self):
-        # Load player image (spaceship)
-        try:
-            self.player_img = pygame.image.load('game_images/spaceship.png').convert_alpha()
-            self.player_img = pygame.transform.scale(self.player_img, (scale_value(50), scale_value(50, False)))
-        except:
-            self.player_img = pygame.Surface((scale_value(50), scale_value(50, False)), pygame.SRCALPHA)
-            pygame.draw.polygon(self.player_img, BLUE, [(scale_value(25), 0), (0, scale_value(50, False)), (scale_value(50), scale_value(50, False))])
-        
-        # Load enemy images (aliens)
-        enemy_size = (scale_value(40), scale_value(40, False))
-        try:
-            self.enemy_img_10 = pygame.image.load('game_images/alien1.png').convert_alpha()
-            self.enemy_img_10 = pygame.transform.scale(self.enemy_img_10, enemy_size)
-            
-            self.enemy_img_30 = pygame.image.load('game_images/alien2.png').convert_alpha()
-            self.enemy_img_30 = pygame.transform.scale(self.enemy_img_30, enemy_size)
-            
-            self.enemy_img_50 = pygame.image.load('game_images/alien3.png').convert_alpha()
-            self.enemy_img_50 = pygame.transform.scale(self.enemy_img_50, enemy_size)
-        except:
-            self.enemy_img_10 = pygame.Surface(enemy_size, pygame.SRCALPHA)
-            pygame.draw.circle(self.enemy_img_10, GREEN, (enemy_size[0]//2, enemy_size[1]//2), enemy_size[0]//2)
-            
-            self.enemy_img_30 = pygame.Surface(enemy_size, pygame.SRCALPHA)
-            pygame.draw.circle(self.enemy_img_30, RED, (enemy_size[0]//2, enemy_size[1]//2), enemy_size[0]//2)
-            
-            self.enemy_img_50 = pygame.Surface(enemy_size, pygame.SRCALPHA)
-            pygame.draw.circle(self.enemy_img_50, BLUE, (enemy_size[0]//2, enemy_size[1]//2), enemy_size[0]//2)
+    def load_images(self, size):
+        """Sprite surfaces for a window size, not yet converted to the display format"""
+        images = load_sprites(size, self.assets)
         
-        # Load bullet image
-        bullet_size = (scale_value(10), scale_value(20, False))
-        try:
-            self.bullet_img = pygame.image.load('game_images/bullet.png').convert_alpha()
-            self.bullet_img = pygame.transform.scale(self.bullet_img, bullet_size)
-        except:
-            self.bullet_img = pygame.Surface(bullet_size, pygame.SRCALPHA)
-            pygame.draw.rect(self.bullet_img, RED, (0, 0, bullet_size[0], bullet_size[1]))
-        
-        # Load powerup images
-        powerup_size = (scale_value(30), scale_value(30, False))
-        try:
-            self.powerup_img = pygame.image.load('game_images/powerup.png').convert_alpha()
-            self.powerup_img = pygame.transform.scale(self.powerup_img, powerup_size)
-            
-            self.heart_powerup_img = pygame.image.load('game_images/heart_powerup.png').convert_alpha()
-            self.heart_powerup_img = pygame.transform.scale(self.heart_powerup_img, powerup_size)
-        except:
-            self.powerup_img = pygame.Surface(powerup_size, pygame.SRCALPHA)
-            pygame.draw.rect(self.powerup_img, CYAN, (0, 0, powerup_size[0], powerup_size[1]))
-            
-            self.heart_powerup_img = pygame.Surface(powerup_size, pygame.SRCALPHA)
-            pygame.draw.circle(self.heart_powerup_img, RED, (powerup_size[0]//2, powerup_size[1]//2), powerup_size[0]//2)
-            
         # Create heart images for lives
-        heart_size = scale_value(20)
-        self.heart_full = pygame.Surface((heart_size, heart_size), pygame.SRCALPHA)
-        self.heart_empty = pygame.Surface((heart_size, heart_size), pygame.SRCALPHA)
+        heart_size = scale_value(20, True, size)
+        heart_full = pygame.Surface((heart_size, heart_size), pygame.SRCALPHA)
+        heart_empty = pygame.Surface((heart_size, heart_size), pygame.SRCALPHA)
         
         # Draw heart shape - scale the points based on screen size
         points = []
@@ -339,59 +403,89 @@ class Game:
             points.append((int(x * heart_size / 20), int(y * heart_size / 20)))
         
         # Full heart (red)
-        pygame.draw.polygon(self.heart_full, RED, points)
+        pygame.draw.polygon(heart_full, RED, points)
         
         # Empty heart (outline only)
-        pygame.draw.polygon(self.heart_empty, RED, points, 1)
+        pygame.draw.polygon(heart_empty, RED, points, 1)
+        
+        images['heart_full'] = heart_full
+        images['heart_empty'] = heart_empty
+        return images
         
-    def load_high_score(self):
+    def record_high_score(self):
+        self.scores.add(run_entry(self.sim))
+        self.high_score = self.scores.high_score
+            
+    def save_recording(self):
+        if self.recorder.recording is None:
+            return
+        path = os.path.join(self.record_dir, time.strftime('game-%Y%m%d-%H%M%S.replay'))
         try:
-            with open('high_score.txt', 'r') as f:
-                return int(f.read())
-        except:
-            return 0
-            
-    def save_high_score(self):
-        with open('high_score.txt', 'w') as f:
-            f.write(str(self.high_score))
-            
-    def spawn_enemies(self):
-        # Clear existing enemies
-        self.enemies.empty()
-        
-        # Spawn enemies with different point values
-        for _ in range(5):  # 10-point enemies
-            enemy = Enemy(self.enemy_img_10, 10)
-            self.enemies.add(enemy)
-            
-        for _ in range(3):  # 30-point enemies
-            enemy = Enemy(self.enemy_img_30, 30)
-            self.enemies.add(enemy)
-            
-        for _ in range(2):  # 50-point enemies
-            enemy = Enemy(self.enemy_img_50, 50)
-            self.enemies.add(enemy)
-            
-    def spawn_powerup(self):
-        if random.random() < 0.01:  # 1% chance to spawn a powerup
-            powerup_type = random.choice(["speed", "rapid_fire", "heart"])
-            
-            if powerup_type == "heart":
-                powerup = PowerUp(self.heart_powerup_img, "heart")
-            else:
-                powerup = PowerUp(self.powerup_img, powerup_type)
-                
-            self.powerups.add(powerup)
+            os.makedirs(self.record_dir, exist_ok=True)
+            self.recorder.finish(self.sim, path)
+            print(f"Saved replay to {path}")
+        except OSError as e:
+            print(f"Failed to save replay: {e}")
             
+    def save_game(self):
+        try:
+            savestate.save(SAVE_PATH, self.sim)
+            print(f"Saved game to {SAVE_PATH}")
+        except OSError as e:
+            print(f"Failed to save game: {e}")
+            
+    def resume_game(self):
+        """Carry on with the quick save"""
+        try:
+            savestate.load(SAVE_PATH, self.sim)
+        except (OSError, ValueError) as e:
+            print(f"Failed to resume game: {e}")
+            return
+        # Saved at another window size: fit it to this one
+        if (self.sim.config.width, self.sim.config.height) != self.last_window_size:
+            self.sim.resize(*self.last_window_size)
+        # A resumed game cannot be replayed from its seed
+        self.recorder.discard()
+        self.rewind.clear()
+        self.interpolator.clear()
+        self.particles.clear()
+        self.fire_pressed = False
+        self.state = self.sim.state
+            
+    def idle(self):
+        """True while the screen is static and nothing will change it without input"""
+        return (self.state != GAME and self.static_key is not None and not self.show_profiler and
+                self.resize_preview is None and not self.resizer.busy)
+        
     def handle_events(self):
-        for event in pygame.event.get():
+        events = pygame.event.get()
+        if not events and self.idle():
+            # Sleep until something happens instead of redrawing the same screen
+            event = pygame.event.wait(IDLE_WAIT_MS)
+            if event.type != NOEVENT:
+                events = [event] + pygame.event.get()
+        for event in events:
             if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
+                self.quit()
+                
+            # The window contents were lost (uncovered, restored)
+            elif event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                self.static_key = None
                 
             # Handle window resize events
             elif event.type == VIDEORESIZE:
-                self.handle_resize(event.w, event.h)
+                self.begin_resize(event.w, event.h)
+                
+            # Toggle the frame profiler overlay
+            elif event.type == KEYDOWN and event.key == K_F3:
+                self.show_profiler = not self.show_profiler
+                self.profiler.enabled = self.show_profiler or self.profile_path is not None
+                self.renderer.invalidate()
+                
+            # Resume the quick save, from the menu or in the middle of a game
+            elif event.type == KEYDOWN and event.key == K_F9 and self.client is None:
+                self.resume_game()
+                continue
                 
             if self.state == MENU:
                 if event.type == KEYDOWN:
@@ -401,107 +495,170 @@ class Game:
                         self.menu_selection = (self.menu_selection + 1) % len(self.menu_options)
                     elif event.key == K_RETURN:
                         if self.menu_selection == 0:  # New Game
+                            if self.client is None:
+                                self.sim.reset()
+                                if self.record_dir:
+                                    self.recorder.start(self.sim)
+                                self.rewind.clear()
+                            self.interpolator.clear()
+                            self.particles.clear()
                             self.state = GAME
-                            self.score = 0
-                            self.lives = 3
-                            self.player.reset()
-                            self.spawn_enemies()
+                            self.fire_pressed = False
                         elif self.menu_selection == 1:  # High Score
                             pass  # Just display high score on menu
                         elif self.menu_selection == 2:  # Exit
-                            pygame.quit()
-                            sys.exit()
+                            self.quit()
             
             elif self.state == GAME:
                 if event.type == KEYDOWN:
+                    if event.key == K_F5 and self.client is None:
+                        self.save_game()
                     if event.key == K_SPACE:
-                        self.player.shoot(self.bullets, self.bullet_img)
+                        self.fire_pressed = True
+                    if event.key in (K_SPACE, K_LEFT, K_RIGHT) and self.input_time is None:
+                        self.input_time = time.perf_counter()
+                        self.input_applied = False
                         
             elif self.state == GAME_OVER or self.state == VICTORY:
                 if event.type == KEYDOWN:
                     if event.key == K_RETURN:
                         self.state = MENU
                     
+    def read_actions(self):
+        """Turn the keyboard state into per-tick action flags for the simulation"""
+        keys = pygame.key.get_pressed()
+        actions = 0
+        if keys[K_LEFT]:
+            actions |= ACTION_LEFT
+        if keys[K_RIGHT]:
+            actions |= ACTION_RIGHT
+        if self.fire_pressed:
+            actions |= ACTION_FIRE
+            self.fire_pressed = False
+        return actions
+        
     def update(self):
-        if self.state == GAME:
-            # Update player
-            keys = pygame.key.get_pressed()
-            self.player.update(keys)
-            
-            # Update bullets
-            self.bullets.update()
-            
-            # Update enemies
-            self.enemies.update()
-            
-            # Update powerups
-            self.powerups.update()
-            self.spawn_powerup()
-            
-            # Check for bullet-enemy collisions
-            hits = pygame.sprite.groupcollide(self.bullets, self.enemies, True, True)
-            for hit in hits:
-                for enemy in hits[hit]:
-                    self.score += enemy.points
-                
-            # Check for player-enemy collisions
-            if pygame.sprite.spritecollide(self.player, self.enemies, True):
-                self.lives -= 1
-                if self.lives <= 0:
-                    self.state = GAME_OVER
-                    if self.score > self.high_score:
-                        self.high_score = self.score
-                        self.save_high_score()
-                        
-            # Check for player-powerup collisions
-            powerup_hits = pygame.sprite.spritecollide(self.player, self.powerups, True)
-            for powerup in powerup_hits:
-                if powerup.powerup_type == "speed":
-                    self.player.speed_boost()
-                elif powerup.powerup_type == "rapid_fire":
-                    self.player.rapid_fire()
-                elif powerup.powerup_type == "heart" and self.lives < self.max_lives:
-                    self.lives += 1
-                    
-            # Check if player reached target score
-            if self.score >= self.target_score:
-                self.state = VICTORY
-                if self.score > self.high_score:
-                    self.high_score = self.score
-                    self.save_high_score()
-                    
-            # Spawn new enemies if all are defeated
-            if len(self.enemies) == 0:
-                self.spawn_enemies()
+        """Advance the game by one simulation tick"""
+        if self.state == GAME and self.client is not None:
+            self.update_remote()
+        elif self.state == GAME and pygame.key.get_pressed()[K_BACKSPACE]:
+            # Time runs backwards while Backspace is held, and stands still once the buffer is used up
+            self.interpolator.snapshot(self.sim)
+            if len(self.rewind):
+                with self.profiler.phase('rewind'):
+                    self.rewind.rewind(self.sim)
+                self.recorder.truncate(self.sim.tick_count)
+            self.particles.update(1 / self.sim.config.tick_rate)
+        elif self.state == GAME:
+            actions = self.read_actions()
+            self.recorder.record(actions)
+            self.interpolator.snapshot(self.sim)
+            self.sim.step(actions)
+            if self.input_time is not None:
+                self.input_applied = True
+            self.state = self.sim.state
+            
+            with self.profiler.phase('rewind'):
+                self.rewind.push(self.sim, actions)
+            self.profiler.count('rewind_kb', self.rewind.bytes // 1024)
+            
+            with self.profiler.phase('particles'):
+                self.emit_particles()
+                self.particles.update(1 / self.sim.config.tick_rate)
+            
+            self.profiler.count('enemies', len(self.sim.enemies))
+            self.profiler.count('bullets', len(self.sim.bullets))
+            self.profiler.count('powerups', len(self.sim.powerups))
+            
+            # Record the high score when the game ends
+            if self.state != GAME:
+                self.record_high_score()
+                self.save_recording()
                 
-    def draw(self):
+    def update_remote(self):
+        """Send input to the game server and mirror the newest snapshot it sent"""
+        self.interpolator.snapshot(self.sim)
+        was_playing = self.sim.state == GAME
+        newest = self.client.poll(self.read_actions())
+        if self.client.closed:
+            print("Lost the connection to the game server")
+            self.client = None
+            self.menu_options[0] = "New Game"
+            self.state = MENU
+            return
+        if newest is not None:
+            snapshot.apply(newest, self.sim)
+            # The server starts the next game on its own; only show the end
+            # screen when a game ends while we watch
+            if was_playing and self.sim.state != GAME:
+                self.state = self.sim.state
+        with self.profiler.phase('particles'):
+            self.emit_particles()
+            self.particles.update(1 / self.sim.config.tick_rate)
+        
+    def emit_particles(self):
+        """Particle bursts for what was hit during the last tick, plus the engine trail"""
+        particles = self.particles
+        speed = (60 * SCALE_Y, 240 * SCALE_Y)
+        scale_x, scale_y = self.draw_scale
+        for kind, x, y, value in self.sim.events:
+            x = x * scale_x
+            y = y * scale_y
+            if kind == 'enemy_killed':
+                colors = [PARTICLE_INDEX[points] for points in value.tolist()]
+                particles.emit(x, y, 12, colors, speed=speed)
+            elif kind == 'player_hit':
+                particles.emit(x, y, 40, PARTICLE_INDEX['player_hit'], speed=(2 * speed[0], 2 * speed[1]), life=(0.4, 1.0))
+            else:
+                colors = [PARTICLE_INDEX[POWERUP_TYPES[powerup]] for powerup in value.tolist()]
+                particles.emit(x, y, 16, colors, speed=speed, life=(0.2, 0.5))
+        
+        # Exhaust drifting down from under the ship
+        rect = self.sim.player.rect
+        particles.emit(rect.centerx * scale_x, rect.bottom * scale_y, 2, PARTICLE_INDEX['trail'], speed=speed,
+                       life=(0.1, 0.3), angle=(np.pi / 2 - 0.3, np.pi / 2 + 0.3))
+        
+    def static_screen_key(self):
+        """Everything a menu or end screen depends on"""
+        return (self.state, self.menu_selection, self.high_score, self.sim.score)
+        
+    def draw(self, alpha=1.0):
+        """Draw a frame; alpha is how far (0-1) the clock has moved towards the next tick"""
+        if self.state != GAME:
+            # Static screens are composited once and left alone until they change
+            key = self.static_screen_key()
+            if key == self.static_key:
+                return
+            # The profiler overlay changes every frame
+            self.static_key = None if self.show_profiler else key
+            
         # Draw appropriate background based on game state
         if self.state == MENU:
-            self.screen.blit(self.menu_background, (0, 0))
+            self.canvas.blit(self.menu_background, (0, 0))
             
             # Draw title with glow effect
             y_offset = scale_value(100, False)
-            title_shadow = self.font_large.render("ALIEN INVASION", True, DEEP_BLUE)
-            title = self.font_large.render("ALIEN INVASION", True, BRIGHT_YELLOW)
+            title_shadow = self.text.render(self.font_large, "ALIEN INVASION", True, DEEP_BLUE)
+            title = self.text.render(self.font_large, "ALIEN INVASION", True, BRIGHT_YELLOW)
             
             # Draw shadow slightly offset for glow effect
-            self.screen.blit(title_shadow, (SCREEN_WIDTH//2 - title.get_width()//2 + 2, y_offset + 2))
-            self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, y_offset))
+            self.canvas.blit(title_shadow, (SCREEN_WIDTH//2 - title.get_width()//2 + 2, y_offset + 2))
+            self.canvas.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, y_offset))
             
             # Draw menu options with better colors
             for i, option in enumerate(self.menu_options):
                 if i == self.menu_selection:
                     # Selected option gets a highlight effect
-                    glow = self.font_medium.render(option, True, NEON_PINK)
-                    text = self.font_medium.render(option, True, BRIGHT_YELLOW)
+                    glow = self.text.render(self.font_medium, option, True, NEON_PINK)
+                    text = self.text.render(self.font_medium, option, True, BRIGHT_YELLOW)
                     # Draw a rectangle behind selected option
                     text_rect = text.get_rect(center=(SCREEN_WIDTH//2, scale_value(280 + i * 60, False)))
-                    pygame.draw.rect(self.screen, (50, 0, 50, 128), 
+                    pygame.draw.rect(self.canvas, (50, 0, 50, 128), 
                                     text_rect.inflate(scale_value(20), scale_value(10, False)), 
                                     border_radius=scale_value(5))
                 else:
                     glow = None
-                    text = self.font_medium.render(option, True, CYAN)
+                    text = self.text.render(self.font_medium, option, True, CYAN)
                 
                 # Center the text
                 text_x = SCREEN_WIDTH//2 - text.get_width()//2
@@ -509,197 +666,265 @@ class Game:
                 
                 # Draw glow effect for selected item
                 if glow:
-                    self.screen.blit(glow, (text_x + 1, text_y + 1))
+                    self.canvas.blit(glow, (text_x + 1, text_y + 1))
                 
-                self.screen.blit(text, (text_x, text_y))
+                self.canvas.blit(text, (text_x, text_y))
                 
             # Draw high score
-            high_score_text = self.font_small.render(f"High Score: {self.high_score}", True, BRIGHT_YELLOW)
-            self.screen.blit(high_score_text, (SCREEN_WIDTH//2 - high_score_text.get_width()//2, SCREEN_HEIGHT - scale_value(50, False)))
+            high_score_text = self.text.render(self.font_small, f"High Score: {self.high_score}", True, BRIGHT_YELLOW)
+            self.canvas.blit(high_score_text, (SCREEN_WIDTH//2 - high_score_text.get_width()//2, SCREEN_HEIGHT - scale_value(50, False)))
             
         elif self.state == GAME:
-            # Draw game background
-            self.screen.blit(self.background, (0, 0))
-            
-            # Draw player
-            self.screen.blit(self.player.image, self.player.rect)
+            # Gameplay only redraws the regions that changed
+            self.draw_game(alpha)
+            return
             
-            # Draw bullets
-            self.bullets.draw(self.screen)
-            
-            # Draw enemies
-            self.enemies.draw(self.screen)
+        elif self.state == GAME_OVER:
+            # Draw game background
+            self.canvas.blit(self.background, (0, 0))
             
-            # Draw powerups
-            self.powerups.draw(self.screen)
+            game_over_text = self.text.render(self.font_large, "GAME OVER", True, RED)
+            self.canvas.blit(game_over_text, (SCREEN_WIDTH//2 - game_over_text.get_width()//2, SCREEN_HEIGHT//2 - scale_value(100, False)))
             
-            # Draw HUD
-            score_text = self.font_small.render(f"Score: {self.score} / {self.target_score}", True, BRIGHT_YELLOW)
-            self.screen.blit(score_text, (scale_value(10), scale_value(10, False)))
+            score_text = self.text.render(self.font_medium, f"Final Score: {self.sim.score}", True, CYAN)
+            self.canvas.blit(score_text, (SCREEN_WIDTH//2 - score_text.get_width()//2, SCREEN_HEIGHT//2))
             
-            # Draw lives as hearts - only show 3 hearts max
-            for i in range(self.max_lives):  # Maximum 3 hearts
-                if i < self.lives:
-                    self.screen.blit(self.heart_full, (scale_value(10 + i * 25), scale_value(40, False)))
-                else:
-                    self.screen.blit(self.heart_empty, (scale_value(10 + i * 25), scale_value(40, False)))
+            continue_text = self.text.render(self.font_small, "Press ENTER to continue", True, WHITE)
+            self.canvas.blit(continue_text, (SCREEN_WIDTH//2 - continue_text.get_width()//2, SCREEN_HEIGHT//2 + scale_value(100, False)))
             
-        elif self.state == GAME_OVER:
+        elif self.state == VICTORY:
             # Draw game background
-            self.screen.blit(self.background, (0, 0))
+            self.canvas.blit(self.background, (0, 0))
             
-            game_over_text = self.font_large.render("GAME OVER", True, RED)
-            self.screen.blit(game_over_text, (SCREEN_WIDTH//2 - game_over_text.get_width()//2, SCREEN_HEIGHT//2 - scale_value(100, False)))
+            victory_text = self.text.render(self.font_large, "VICTORY!", True, BRIGHT_YELLOW)
+            self.canvas.blit(victory_text, (SCREEN_WIDTH//2 - victory_text.get_width()//2, SCREEN_HEIGHT//2 - scale_value(100, False)))
             
-            score_text = self.font_medium.render(f"Final Score: {self.score}", True, CYAN)
-            self.screen.blit(score_text, (SCREEN_WIDTH//2 - score_text.get_width()//2, SCREEN_HEIGHT//2))
+            score_text = self.text.render(self.font_medium, f"Final Score: {self.sim.score}", True, CYAN)
+            self.canvas.blit(score_text, (SCREEN_WIDTH//2 - score_text.get_width()//2, SCREEN_HEIGHT//2))
             
-            continue_text = self.font_small.render("Press ENTER to continue", True, WHITE)
-            self.screen.blit(continue_text, (SCREEN_WIDTH//2 - continue_text.get_width()//2, SCREEN_HEIGHT//2 + scale_value(100, False)))
+            continue_text = self.text.render(self.font_small, "Press ENTER to continue", True, WHITE)
+            self.canvas.blit(continue_text, (SCREEN_WIDTH//2 - continue_text.get_width()//2, SCREEN_HEIGHT//2 + scale_value(100, False)))
             
-        elif self.state == VICTORY:
-            # Draw game background
-            self.screen.blit(self.background, (0, 0))
+        if self.show_profiler:
+            for image, position in self.profiler_overlay():
+                self.canvas.blit(image, position)
+                
+        # The next gameplay frame has to repaint the whole screen
+        self.renderer.invalidate()
+        with self.profiler.phase('flip'):
+            if self.canvas is not self.screen:
+                # Drawn at the internal resolution; scale it up to the window
+                pygame.transform.scale(self.canvas, self.screen.get_size(), self.screen)
+            pygame.display.flip()
+        
+    def draw_game(self, alpha=1.0):
+        renderer = self.renderer
+        profiler = self.profiler
+        
+        # Restore the background under last frame's sprites
+        with profiler.phase('background'):
+            renderer.begin(self.canvas, self.background)
+        
+        # Everything in the frame is collected as (image, position, area) and
+        # drawn with one blits call; sprites are areas of the atlas. The
+        # tuples are built with zip/map so thousands of sprites stay cheap
+        atlas = self.atlas.surface
+        rects = self.atlas.rects
+        blits = []
+        
+        with profiler.phase('sprites'):
+            # Draw player
+            interpolator = self.interpolator
+            scale = self.draw_scale
+            blits.append((atlas, interpolator.player_position(self.sim.player, alpha, scale), rects['player_img']))
             
-            victory_text = self.font_large.render("VICTORY!", True, BRIGHT_YELLOW)
-            self.screen.blit(victory_text, (SCREEN_WIDTH//2 - victory_text.get_width()//2, SCREEN_HEIGHT//2 - scale_value(100, False)))
+            # Draw bullets
+            bullets = self.sim.bullets
+            area = rects['bullet_img']
+            xs, ys = interpolator.positions('bullets', bullets, bullets.active(), alpha, scale)
+            blits.extend(zip(repeat(atlas), zip(xs, ys), repeat(area)))
             
-            score_text = self.font_medium.render(f"Final Score: {self.score}", True, CYAN)
-            self.screen.blit(score_text, (SCREEN_WIDTH//2 - score_text.get_width()//2, SCREEN_HEIGHT//2))
+            # Draw enemies
+            enemies = self.sim.enemies
+            enemy_rects = {10: rects['enemy_img_10'], 30: rects['enemy_img_30'], 50: rects['enemy_img_50']}
+            active = enemies.active()
+            xs, ys = interpolator.positions('enemies', enemies, active, alpha, scale)
+            blits.extend(zip(repeat(atlas), zip(xs, ys), map(enemy_rects.__getitem__, enemies.points[active].tolist())))
             
-            continue_text = self.font_small.render("Press ENTER to continue", True, WHITE)
-            self.screen.blit(continue_text, (SCREEN_WIDTH//2 - continue_text.get_width()//2, SCREEN_HEIGHT//2 + scale_value(100, False)))
+            # Draw powerups
+            powerups = self.sim.powerups
+            powerup_rects = [rects['heart_powerup_img'] if kind == "heart" else rects['powerup_img']
+                             for kind in POWERUP_TYPES]
+            active = powerups.active()
+            xs, ys = interpolator.positions('powerups', powerups, active, alpha, scale)
+            blits.extend((atlas, (x, y), powerup_rects[kind])
+                         for kind, x, y in zip(powerups.kind[active].tolist(), xs, ys))
+            
+            # Particles on top, drawn where they were between the last two ticks
+            blits.extend(self.particles.blits((1 - alpha) / self.sim.config.tick_rate))
+        
+        with profiler.phase('hud'):
+            # Draw HUD
+            if self.sim.waves is None:
+                hud = f"Score: {self.sim.score} / {self.sim.target_score}"
+            else:
+                # Swarm mode has no target score; show how much of the script is left
+                hud = f"Score: {self.sim.score}   Swarm: {len(self.sim.waves) - self.sim.wave_cursor + len(self.sim.enemies)} left"
+            score_text = self.text.render(self.font_small, hud, True, BRIGHT_YELLOW)
+            blits.append((score_text, (scale_value(10), scale_value(10, False))))
             
-        pygame.display.flip()
+            # Draw lives as hearts - only show 3 hearts max
+            for i in range(self.sim.max_lives):  # Maximum 3 hearts
+                heart = rects['heart_full'] if i < self.sim.lives else rects['heart_empty']
+                blits.append((atlas, (scale_value(10 + i * 25), scale_value(40, False)), heart))
+            
+            if self.show_profiler:
+                blits.extend(self.profiler_overlay())
+        
+        with profiler.phase('blit'):
+            renderer.blits(blits)
+        
+        # Push only the changed regions, or flip if too much changed; an
+        # offscreen frame is scaled up to the window as a whole
+        with profiler.phase('flip'):
+            renderer.present(None if self.canvas is self.screen else self.screen)
+        
+    def profiler_overlay(self):
+        """Profiler text lines and their positions, refreshed twice a second"""
+        if not self.profiler_lines or self.profiler.frames % 30 == 0:
+            self.profiler_lines = [self.font_small.render(line, True, GREEN, BLACK)
+                                   for line in self.profiler.overlay_lines()]
+        line_height = self.font_small.get_linesize()
+        return [(image, (SCREEN_WIDTH - image.get_width() - scale_value(10), scale_value(10, False) + i * line_height))
+                for i, image in enumerate(self.profiler_lines)]
+        
+    def first_frame(self):
+        """Close the startup timeline (with a budget, report it and exit) and start fetching assets"""
+        self.startup.mark('first_frame')
+        if self.startup_budget is not None:
+            print("\n".join(self.startup.report()))
+            elapsed = self.startup.elapsed('first_frame')
+            if elapsed > self.startup_budget:
+                print(f"Time to first frame {elapsed:.1f} ms is over the {self.startup_budget:g} ms budget")
+                self.quit(1)
+            self.quit()
+        if self.prefetch_assets:
+            self.prefetch = Prefetch().start()
+        
+    def quit(self, status=0):
+        if self.prefetch is not None:
+            self.prefetch.cancel()
+        if self.profile_path:
+            self.profiler.export(self.profile_path)
+            print(f"Wrote frame profile to {self.profile_path}")
+        # Wait for the last results to reach the disk
+        self.scores.close()
+        if self.client is not None:
+            self.client.close()
+        pygame.quit()
+        sys.exit(status)
         
     def run(self):
+        profiler = self.profiler
+        # Fixed-step simulation: ticks happen at tick_rate whatever the frame
+        # rate, and frames are drawn between them
+        accumulator = 0.0
+        previous = time.perf_counter()
+        first_frame = True
         while True:
-            self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(60)
-
-class Player(pygame.sprite.Sprite):
-    def __init__(self, image):
-        super().__init__()
-        self.original_image = image
-        self.image = self.original_image
-        self.rect = self.image.get_rect()
-        self.rect.centerx = SCREEN_WIDTH // 2
-        self.rect.bottom = SCREEN_HEIGHT - scale_value(10, False)
-        self.speed = scale_value(5)  # Scale speed based on screen width
-        self.normal_speed = scale_value(5)
-        self.cooldown = 0
-        self.normal_cooldown = 20
-        self.rapid_fire_timer = 0
-        self.speed_boost_timer = 0
-        
-    def update(self, keys):
-        # Movement
-        if keys[K_LEFT] and self.rect.left > 0:
-            self.rect.x -= self.speed
-        if keys[K_RIGHT] and self.rect.right < SCREEN_WIDTH:
-            self.rect.x += self.speed
-            
-        # Cooldown for shooting
-        if self.cooldown > 0:
-            self.cooldown -= 1
-            
-        # Handle power-up timers
-        if self.rapid_fire_timer > 0:
-            self.rapid_fire_timer -= 1
-            if self.rapid_fire_timer == 0:
-                self.cooldown = self.normal_cooldown
-                
-        if self.speed_boost_timer > 0:
-            self.speed_boost_timer -= 1
-            if self.speed_boost_timer == 0:
-                self.speed = self.normal_speed
+            frame_start = time.perf_counter()
+            # A resumed save brings its own tick rate
+            tick_time = 1 / self.sim.config.tick_rate
+            playing = self.state == GAME
+            with profiler.phase('events'):
+                self.handle_events()
+            
+            # After a long stall, drop the lost time instead of racing to catch
+            # up; time spent in the menu does not count at all
+            now = time.perf_counter()
+            accumulator = accumulator + min(now - previous, MAX_FRAME_TIME) if playing else 0.0
+            previous = now
+            with profiler.phase('update'):
+                while accumulator >= tick_time:
+                    self.update()
+                    accumulator -= tick_time
+            
+            # Swap in rebuilt surfaces once a resize has settled
+            resized = self.resizer.poll()
+            if resized:
+                self.handle_resize(*resized)
+            elif self.resize_preview is not None and not self.resizer.busy:
+                # The rebuild failed: go back to the window size the current surfaces fit
+                self.screen = self.set_display_mode(self.last_window_size)
+                self.resize_preview = None
+                self.renderer.invalidate()
+            
+            # Rebuild the surfaces once background downloads brought new assets
+            if self.prefetch is not None and self.prefetch.done:
+                if self.prefetch.fetched and not self.resizer.busy:
+                    self.resizer.request(self.last_window_size)
+                self.prefetch = None
                 
-    def shoot(self, bullets_group, bullet_img):
-        if self.cooldown == 0:
-            bullet = Bullet(bullet_img, self.rect.centerx, self.rect.top)
-            bullets_group.add(bullet)
-            self.cooldown = 5 if self.rapid_fire_timer > 0 else self.normal_cooldown
-            
-    def reset(self):
-        self.rect.centerx = SCREEN_WIDTH // 2
-        self.rect.bottom = SCREEN_HEIGHT - scale_value(10, False)
-        self.speed = self.normal_speed
-        self.cooldown = 0
-        self.rapid_fire_timer = 0
-        self.speed_boost_timer = 0
-        
-    def rapid_fire(self):
-        self.rapid_fire_timer = 300  # 5 seconds at 60 FPS
-        self.cooldown = 5
-        
-    def speed_boost(self):
-        self.speed_boost_timer = 300  # 5 seconds at 60 FPS
-        self.speed = self.normal_speed * 2
-
-class Enemy(pygame.sprite.Sprite):
-    def __init__(self, image, points):
-        super().__init__()
-        self.image = image
-        self.rect = self.image.get_rect()
-        self.rect.x = random.randint(0, SCREEN_WIDTH - self.rect.width)
-        self.rect.y = random.randint(-scale_value(100, False), -scale_value(40, False))
-        self.points = points
-        
-        # Set speed based on points (higher points = faster enemies)
-        # Scale speed based on screen height
-        base_speed = 0
-        if points == 10:
-            base_speed = 2
-        elif points == 30:
-            base_speed = 3
-        else:  # 50 points
-            base_speed = 4
-            
-        self.speed = scale_value(base_speed, False)
-        
-    def update(self):
-        self.rect.y += self.speed
-        
-        # If enemy goes off screen, reset position
-        if self.rect.top > SCREEN_HEIGHT:
-            self.rect.x = random.randint(0, SCREEN_WIDTH - self.rect.width)
-            self.rect.y = random.randint(-scale_value(100, False), -scale_value(40, False))
-
-class Bullet(pygame.sprite.Sprite):
-    def __init__(self, image, x, y):
-        super().__init__()
-        self.image = image
-        self.rect = self.image.get_rect()
-        self.rect.centerx = x
-        self.rect.bottom = y
-        self.speed = -scale_value(10, False)  # Scale speed based on screen height
-        
-    def update(self):
-        self.rect.y += self.speed
-        
-        # Remove bullet if it goes off screen
-        if self.rect.bottom < 0:
-            self.kill()
-
-class PowerUp(pygame.sprite.Sprite):
-    def __init__(self, image, powerup_type):
-        super().__init__()
-        self.image = image
-        self.rect = self.image.get_rect()
-        self.rect.x = random.randint(0, SCREEN_WIDTH - self.rect.width)
-        self.rect.y = -self.rect.height
-        self.speed = scale_value(3, False)  # Scale speed based on screen height
-        self.powerup_type = powerup_type
-        
-    def update(self):
-        self.rect.y += self.speed
-        
-        # Remove powerup if it goes off screen
-        if self.rect.top > SCREEN_HEIGHT:
-            self.kill()
+            with profiler.phase('draw'):
+                if self.resize_preview is not None:
+                    self.draw_resize_preview()
+                else:
+                    self.draw(accumulator / tick_time)
+            if first_frame:
+                first_frame = False
+                self.first_frame()
+            
+            # Trade quality for frame time; only gameplay frames count, and
+            # not while surfaces are being rebuilt
+            if (self.governor is not None and self.state == GAME and not self.resizer.busy
+                    and self.resize_preview is None):
+                if self.governor.frame(time.perf_counter() - frame_start) and self.set_quality(self.governor.tier):
+                    self.resizer.request(self.last_window_size)
+                profiler.count('quality', self.quality.name)
+            
+            # A key press counts as displayed once a tick used it and a frame showed the result
+            if self.input_applied:
+                profiler.sample('input_latency', time.perf_counter() - self.input_time)
+                self.input_time = None
+                self.input_applied = False
+            profiler.end_frame()
+            self.clock.tick(self.fps)
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description="Alien Invasion")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="record per-phase frame timings and write them to PATH (.json or .csv) on exit")
+    parser.add_argument('--tick-rate', type=int, default=60, metavar='HZ',
+                        help="simulation ticks per second (default 60); game speed does not change")
+    parser.add_argument('--fps', type=int, default=60,
+                        help="frame rate cap, 0 for uncapped (default 60)")
+    parser.add_argument('--vsync', action='store_true',
+                        help="synchronize frames to the display refresh (implies --fps 0 unless given)")
+    parser.add_argument('--record', metavar='DIR',
+                        help="save a replay of every finished game to DIR (check them with replay.py)")
+    parser.add_argument('--waves', metavar='PATH',
+                        help="swarm mode: enemies come from a wave script (.json or compiled with waves.py)")
+    parser.add_argument('--connect', metavar='HOST:PORT',
+                        help="play on a game server started with 'netplay.py serve'")
+    parser.add_argument('--spectate', action='store_true',
+                        help="with --connect, watch instead of flying the ship")
+    parser.add_argument('--quality', choices=['auto'] + QUALITY_NAMES, default='auto',
+                        help="rendering quality; 'auto' (the default) lowers and raises it to hold the frame rate")
+    parser.add_argument('--offline', action='store_true',
+                        help="do not download missing images or the font (see prefetch.py)")
+    parser.add_argument('--startup-budget', type=float, metavar='MS',
+                        help="print the startup timeline after the first frame and exit; "
+                             "status 1 if the first frame took longer than MS")
+    args = parser.parse_args()
+    
+    fps = args.fps
+    if args.vsync and '--fps' not in sys.argv:
+        fps = 0
+    game = Game(profile_path=args.profile, record_dir=args.record,
+                tick_rate=args.tick_rate, fps=fps, vsync=args.vsync, waves=args.waves,
+                connect=parse_address(args.connect) if args.connect else None, spectate=args.spectate,
+                prefetch=not args.offline, startup_budget=args.startup_budget, quality=args.quality)
+    # Everything allocated during startup lives for the whole session; keep it
+    # out of the garbage collector's way so collections stay short
+    gc.freeze()
     game.run()
@@ -0,0 +1,127 @@
+"""On-disk cache of decoded, pre-scaled images.
+
+Decoding PNG/JPEG files and scaling them to the window size is repeated on
+every start and every resize. AssetCache stores each scaled result as raw
+pixels keyed by (asset, target size, source file hash), so a later load is a
+single file read. Cache misses are decoded and scaled on a worker pool.
+"""
+import hashlib
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+# Cache file header: magic, width, height, has alpha
+_HEADER = struct.Struct('<4sHHB')
+_MAGIC = b'AIC1'
+
+
+class AssetCache:
+    """Scaled images cached as raw pixel files under directory"""
+    def __init__(self, directory=os.path.join('game_images', 'cache'), workers=4):
+        self.directory = directory
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self._hashes = {}  # (path, mtime, size) -> digest
+
+    def source_hash(self, path):
+        """Content hash of a source file, remembered until the file changes"""
+        info = os.stat(path)
+        key = (path, info.st_mtime_ns, info.st_size)
+        digest = self._hashes.get(key)
+        if digest is None:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()[:16]
+            self._hashes[key] = digest
+        return digest
+
+    def cache_path(self, name, size, digest):
+        return os.path.join(self.directory, f"{name}-{size[0]}x{size[1]}-{digest}.raw")
+
+    def read(self, path):
+        """Load a cached surface, or None if it is missing or unreadable"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        magic, width, height, alpha = _HEADER.unpack_from(data)
+        pixel_format = 'RGBA' if alpha else 'RGB'
+        if magic != _MAGIC or len(data) - _HEADER.size != width * height * len(pixel_format):
+            return None
+        return pygame.image.frombuffer(data[_HEADER.size:], (width, height), pixel_format)
+
+    def write(self, path, surface, alpha):
+        """Store a surface atomically so a crash never leaves a torn cache file"""
+        os.makedirs(self.directory, exist_ok=True)
+        pixel_format = 'RGBA' if alpha else 'RGB'
+        header = _HEADER.pack(_MAGIC, surface.get_width(), surface.get_height(), int(alpha))
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            f.write(pygame.image.tobytes(surface, pixel_format))
+        os.replace(temp_path, path)
+
+    def prune(self, name, size, keep):
+        """Remove cache files for the same asset and size built from older sources"""
+        prefix = f"{name}-{size[0]}x{size[1]}-"
+        try:
+            entries = os.listdir(self.directory)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.startswith(prefix) and entry != os.path.basename(keep):
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+
+    def build(self, name, source, size, alpha):
+        """Decode and scale a source image, then store it in the cache"""
+        surface = pygame.image.load(source)
+        surface = pygame.transform.scale(surface, size)
+        path = self.cache_path(name, size, self.source_hash(source))
+        try:
+            self.write(path, surface, alpha)
+            self.prune(name, size, path)
+        except OSError as e:
+            print(f"Failed to cache {name}: {e}")
+        return surface
+
+    def load_many(self, requests):
+        """Load (name, source path, size, alpha) requests; returns name -> surface or None.
+
+        Surfaces are not converted to the display format; callers do that on
+        the main thread. A missing or undecodable source gives None.
+        """
+        results = {}
+        misses = []
+        for name, source, size, alpha in requests:
+            try:
+                surface = self.read(self.cache_path(name, size, self.source_hash(source)))
+            except OSError:
+                results[name] = None
+                continue
+            if surface is not None:
+                self.hits += 1
+                results[name] = surface
+            else:
+                misses.append((name, source, size, alpha))
+        if misses:
+            self.misses += len(misses)
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(misses))) as pool:
+                futures = {request[0]: pool.submit(self.build, *request) for request in misses}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"Failed to load {name}: {e}")
+                    results[name] = None
+        return results
+
+    def load(self, name, source, size, alpha=True):
+        return self.load_many([(name, source, size, alpha)])[name]
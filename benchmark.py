@@ -0,0 +1,371 @@
+"""Stress benchmarks for the game's update and draw paths.
+
+Every scenario drives the real Game under the SDL dummy video driver with
+scripted input, so it runs anywhere (including CI) without a window. Each
+frame is timed as Game.update (ticks per second) and Game.draw (frames per
+second) separately, keeping the best of a few runs to filter out noise. A
+separate run under tracemalloc measures how far memory use peaks above its
+level at the start of a frame (the temporary allocations a frame holds at
+once) and the overall peak, since tracing would skew the timings. The player
+never dies and never wins during a benchmark. Scripted window resizes go
+through the game's event handling and background rebuild; the frame waits
+for the rebuild, so it counts towards the update time, and its average is
+reported as resize_ms too.
+
+    python benchmark.py --output results.json
+    python benchmark.py --update-baseline       # store this machine's numbers
+    python benchmark.py                         # compare against them
+
+Exits with status 1 when a scenario is slower (or allocates more) than the
+stored baseline by more than the tolerance. Time to first frame is measured
+in a fresh process (offline, so the network never counts) and can be held to
+a fixed budget:
+
+    python benchmark.py --only menu_idle --startup-budget 800
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import wait
+
+# Must be set before pygame opens a display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+
+import alien_invasion
+from simulation import GameConfig, Simulation, MENU, ACTION_LEFT, ACTION_RIGHT, ACTION_FIRE
+from waves import WaveScript
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+SWARM_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'waves', 'swarm.json')
+
+# Metric -> True if a higher value is better
+METRICS = {
+    'update_ticks_per_s': True,
+    'draw_fps': True,
+    'resize_ms': False,
+    'frame_peak_kb': False,
+    'peak_memory_mb': False,
+}
+
+
+def sweep_and_fire(frame):
+    """Walk left and right across the screen while firing"""
+    actions = ACTION_FIRE
+    actions |= ACTION_LEFT if (frame // 90) % 2 else ACTION_RIGHT
+    return actions
+
+
+def add_swarm(count):
+    def setup(game):
+        # Same mix of point values as a normal wave
+        sim = game.sim
+        sim.add_enemies(count // 2, 10)
+        sim.add_enemies(count * 3 // 10, 30)
+        sim.add_enemies(count - count // 2 - count * 3 // 10, 50)
+    return setup
+
+
+def fast_forward(count):
+    def setup(game):
+        # Play the wave script headless until the swarm is dense enough
+        sim = game.sim
+        while len(sim.enemies) < count:
+            sim.lives = sim.max_lives
+            sim.step(ACTION_FIRE)
+        game.interpolator.clear()
+    return setup
+
+
+def keep_rapid_fire(game, frame):
+    game.sim.player.rapid_fire()
+
+
+def resize_every(frames, sizes):
+    def each_frame(game, frame):
+        if frame % frames == 0:
+            # Goes through handle_events and the resize pipeline like a real window resize
+            width, height = sizes[(frame // frames) % len(sizes)]
+            pygame.event.post(pygame.event.Event(pygame.VIDEORESIZE, w=width, h=height, size=(width, height)))
+    return each_frame
+
+
+def show_menu(game):
+    game.state = MENU
+
+
+def expose_window(game, frame):
+    # The idle menu sleeps in handle_events; this wakes it and forces a full redraw
+    pygame.event.post(pygame.event.Event(pygame.VIDEOEXPOSE))
+
+
+class Scenario:
+    """Scripted setup, per-frame hook and input for one benchmark"""
+    def __init__(self, name, setup=None, each_frame=None, actions=sweep_and_fire, config=None, waves=None,
+                 quality='high', events=False):
+        self.name = name
+        self.waves = waves  # Wave script to play in swarm mode
+        self.quality = quality  # Fixed quality tier, so results don't depend on the governor
+        self.events = events  # Time Game.handle_events as part of the update
+        self.setup = setup
+        self.each_frame = each_frame
+        self.actions = actions
+        self.config = config or {}
+
+
+SCENARIOS = [
+    Scenario('baseline_wave'),
+    Scenario('enemies_1k', setup=add_swarm(1000)),
+    Scenario('enemies_10k', setup=add_swarm(10000)),
+    Scenario('rapid_fire', each_frame=keep_rapid_fire),
+    Scenario('powerup_storm', config={'powerup_chance': 1.0}),
+    Scenario('resize_burst', each_frame=resize_every(30, [(1024, 768), (800, 600), (1280, 720)]), events=True),
+    Scenario('menu_idle', setup=show_menu, each_frame=expose_window, actions=lambda frame: 0, events=True),
+    Scenario('swarm_5k', setup=fast_forward(5000), waves=SWARM_SCRIPT),
+    Scenario('swarm_lowest', setup=fast_forward(5000), waves=SWARM_SCRIPT, quality='lowest'),
+]
+
+
+class Runner:
+    """Runs scenarios against one Game instance at a fixed window size"""
+    def __init__(self, size=(800, 600), frames=600, repeat=3, warmup=60, traced_frames=120, seed=0):
+        self.size = size
+        self.frames = frames
+        self.repeat = repeat
+        self.warmup = warmup
+        self.traced_frames = traced_frames
+        self.seed = seed
+        self.game = alien_invasion.Game(prefetch=False, quality='high')
+        self.game.handle_resize(size, self.game.build_for_window(size))
+        # Scripted resizes arrive one at a time, so each one counts as settled straight away
+        self.game.resizer.settle_time = 0
+        self.resize_time = 0.0
+        self.resizes = 0
+
+    def start(self, scenario):
+        """Fresh game for a scenario, ready to play"""
+        game = self.game
+        # Swarm mode draws with hard-edged sprites, like the game does
+        threshold = 128 if scenario.waves else None
+        rebuild = game.set_quality(alien_invasion.QUALITY_NAMES.index(scenario.quality))
+        if rebuild or game.screen.get_size() != self.size or game.sprite_alpha_threshold != threshold:
+            game.sprite_alpha_threshold = threshold
+            game.handle_resize(self.size, game.build_for_window(self.size))
+        config = GameConfig(*self.size, target_score=10 ** 9, **scenario.config)
+        waves = WaveScript(scenario.waves) if scenario.waves else None
+        game.sim = Simulation(config, seed=self.seed, profiler=game.profiler, waves=waves, masks=game.masks)
+        game.sim.reset(self.seed)
+        game.state = game.sim.state
+        game.renderer.invalidate()
+        game.particles.clear()
+        frame = 0
+        game.read_actions = lambda: scenario.actions(frame)
+        if scenario.setup:
+            scenario.setup(game)
+
+        def step():
+            nonlocal frame
+            if scenario.each_frame:
+                scenario.each_frame(game, frame)
+            game.sim.lives = game.sim.max_lives  # Nobody dies in a benchmark
+            frame += 1
+        return step
+
+    def update(self, scenario):
+        game = self.game
+        if scenario.events:
+            game.handle_events()
+        if game.resizer.busy:
+            # Wait for the background rebuild and swap it in, so the frame pays for all of it
+            start = time.perf_counter()
+            resized = game.resizer.poll()
+            while resized is None:
+                if game.resizer.future is not None:
+                    wait([game.resizer.future])
+                resized = game.resizer.poll()
+            game.handle_resize(*resized)
+            self.resize_time += time.perf_counter() - start
+            self.resizes += 1
+        game.update()
+
+    def timed(self, scenario):
+        game = self.game
+        step = self.start(scenario)
+        for _ in range(self.warmup):
+            step()
+            self.update(scenario)
+            game.draw()
+
+        update_time = draw_time = 0.0
+        self.resize_time = 0.0
+        self.resizes = 0
+        collections = sum(stats['collections'] for stats in gc.get_stats())
+        for _ in range(self.frames):
+            step()
+            start = time.perf_counter()
+            self.update(scenario)
+            middle = time.perf_counter()
+            game.draw()
+            draw_time += time.perf_counter() - middle
+            update_time += middle - start
+        collections = sum(stats['collections'] for stats in gc.get_stats()) - collections
+        result = {
+            'update_ticks_per_s': self.frames / max(update_time, 1e-9),
+            'draw_fps': self.frames / max(draw_time, 1e-9),
+            'gc_collections_per_1k_frames': collections * 1000 / self.frames,
+            'enemies': len(game.sim.enemies),
+            'bullets': len(game.sim.bullets),
+            'powerups': len(game.sim.powerups),
+        }
+        if self.resizes:
+            # Also counted in the update time of the frames they happened in
+            result['resize_ms'] = self.resize_time * 1000 / self.resizes
+        return result
+
+    def traced(self, scenario):
+        """Allocations per frame and peak memory, from a run under tracemalloc"""
+        game = self.game
+        tracemalloc.start()
+        try:
+            step = self.start(scenario)
+            frame_peaks = np.zeros(self.traced_frames)
+            peak = 0
+            for i in range(self.traced_frames):
+                step()
+                before, frame_peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame_peak)
+                tracemalloc.reset_peak()
+                self.update(scenario)
+                game.draw()
+                frame_peaks[i] = tracemalloc.get_traced_memory()[1] - before
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        return {
+            'frame_peak_kb': float(frame_peaks.mean()) / 1024,
+            'peak_memory_mb': peak / 2 ** 20,
+        }
+
+    def run(self, scenario):
+        runs = [self.timed(scenario) for _ in range(self.repeat)]
+        result = runs[-1]
+        for metric in ('update_ticks_per_s', 'draw_fps'):
+            result[metric] = max(run[metric] for run in runs)
+        if 'resize_ms' in result:
+            result['resize_ms'] = min(run['resize_ms'] for run in runs)
+        result.update(self.traced(scenario))
+        return result
+
+
+def measure_startup(runs=3):
+    """Best startup timeline (milestone -> total ms) of a few fresh game processes"""
+    best = None
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alien_invasion.py'),
+                                 '--offline', '--startup-budget', 'inf'],
+                                capture_output=True, text=True, check=True).stdout
+        lines = output[output.index('startup'):].splitlines()[1:]
+        timeline = {line.split()[0]: float(line.split()[2]) for line in lines if len(line.split()) == 3}
+        if best is None or timeline['first_frame'] < best['first_frame']:
+            best = timeline
+    return best
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each metric against the baseline, and whether any regressed"""
+    lines = []
+    regressed = False
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            lines.append(f"{name}: no baseline")
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in previous or metric not in result or not previous[metric]:
+                continue
+            change = result[metric] / previous[metric] - 1
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = '  REGRESSION'
+                regressed = True
+            lines.append(f"{name:<15}{metric:<22}{previous[metric]:12.2f} -> {result[metric]:12.2f} ({change:+.1%}){flag}")
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alien Invasion stress benchmarks")
+    parser.add_argument('--output', metavar='PATH', help="write the results to PATH as JSON")
+    parser.add_argument('--baseline', metavar='PATH', default=DEFAULT_BASELINE,
+                        help=f"baseline results to compare against (default {DEFAULT_BASELINE})")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="store these results as the new baseline instead of comparing")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed relative slowdown or extra allocation before failing (default 0.2)")
+    parser.add_argument('--frames', type=int, default=600, help="timed frames per scenario")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per scenario; the best is kept")
+    parser.add_argument('--size', type=int, nargs=2, default=(800, 600), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--only', nargs='+', metavar='SCENARIO', help="run only these scenarios")
+    parser.add_argument('--startup-budget', type=float, metavar='MS',
+                        help="fail when time to first frame exceeds MS")
+    args = parser.parse_args(argv)
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.only or scenario.name in args.only]
+    runner = Runner(size=tuple(args.size), frames=args.frames, repeat=args.repeat)
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'numpy': np.__version__,
+            'machine': platform.platform(),
+            'size': list(args.size),
+            'frames': args.frames,
+            'repeat': args.repeat,
+        },
+        'scenarios': {},
+    }
+    for scenario in scenarios:
+        result = runner.run(scenario)
+        results['scenarios'][scenario.name] = result
+        print(f"{scenario.name:<15}update {result['update_ticks_per_s']:9.0f} ticks/s   "
+              f"draw {result['draw_fps']:7.0f} fps   {result['frame_peak_kb']:7.1f} KB frame peak   "
+              f"peak {result['peak_memory_mb']:6.2f} MB"
+              + (f"   resize {result['resize_ms']:.1f} ms" if 'resize_ms' in result else ''))
+    results['startup_ms'] = measure_startup()
+    first_frame = results['startup_ms']['first_frame']
+    print(f"{'startup':<15}first frame {first_frame:7.1f} ms   "
+          + "   ".join(f"{name} {ms:.0f}" for name, ms in results['startup_ms'].items() if name != 'first_frame'))
+    over_budget = args.startup_budget is not None and first_frame > args.startup_budget
+    if over_budget:
+        print(f"Time to first frame is over the {args.startup_budget:g} ms budget")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Stored baseline in {args.baseline}")
+        return 1 if over_budget else 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 1 if over_budget else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    lines, regressed = compare(results, baseline, args.tolerance)
+    print("\n".join(lines))
+    return 1 if regressed or over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Array-backed storage for the game's moving entities.
+
+Enemies, bullets and powerups only ever move straight down (or up) at a
+fixed speed and disappear or respawn when they leave the screen. Instead of
+one sprite object per entity, each kind lives in an EntityStore: a set of
+contiguous NumPy arrays (structure of arrays) that are updated with a single
+vectorized operation per tick.
+
+The store is also a pool. Its arrays are preallocated, dead slots go on a free
+list and are handed out again by acquire(), so firing, dying and respawning
+do not allocate anything once the game has warmed up.
+"""
+import numpy as np
+
+# One used slot of a store, as written to save states
+RECORD = np.dtype([('x', '<f4'), ('y', '<f4'), ('w', '<f4'), ('h', '<f4'), ('speed', '<f4'),
+                   ('points', '<i4'), ('kind', 'i1'), ('alive', '?'), ('serial', '<i8')])
+
+
+class EntityStore:
+    """Pooled positions, sizes, speeds, point values and alive flags for one entity kind"""
+    def __init__(self, capacity=64):
+        self.count = 0  # High-water slot; every living entity is below it
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.w = np.zeros(capacity, dtype=np.float32)
+        self.h = np.zeros(capacity, dtype=np.float32)
+        self.speed = np.zeros(capacity, dtype=np.float32)
+        self.points = np.zeros(capacity, dtype=np.int32)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.serial = np.zeros(capacity, dtype=np.int64)  # Acquisition order
+        # Stack of released slots below self.count
+        self.free = np.zeros(capacity, dtype=np.int64)
+        self.free_count = 0
+        self.next_serial = 0
+
+        # Pool statistics
+        self.acquired = 0
+        self.released = 0
+        self.grown = 0
+        self.peak = 0
+
+    _fields = ('x', 'y', 'w', 'h', 'speed', 'points', 'kind', 'alive', 'serial', 'free')
+
+    @property
+    def capacity(self):
+        return len(self.x)
+
+    def __len__(self):
+        return self.count - self.free_count
+
+    def stats(self):
+        """Pool usage: capacity, live entities, high-water mark and churn counters"""
+        return {
+            'capacity': self.capacity,
+            'in_use': len(self),
+            'high_water': self.peak,
+            'acquired': self.acquired,
+            'released': self.released,
+            'grown': self.grown,
+        }
+
+    def _reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2)
+        for name in self._fields:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.grown += 1
+
+    def acquire(self, n=1):
+        """Take n slots from the pool, reusing released ones first; returns their indices"""
+        reused = min(n, self.free_count)
+        self.free_count -= reused
+        fresh = n - reused
+        self._reserve(self.count + fresh)
+        if fresh:
+            slots = np.concatenate((self.free[self.free_count:self.free_count + reused],
+                                    np.arange(self.count, self.count + fresh)))
+            self.count += fresh
+        else:
+            slots = self.free[self.free_count:self.free_count + reused].copy()
+        self.alive[slots] = True
+        self.serial[slots] = np.arange(self.next_serial, self.next_serial + n)
+        self.next_serial += n
+        self.acquired += n
+        self.peak = max(self.peak, len(self))
+        return slots
+
+    def release(self, slots):
+        """Return living slots to the pool, given indices or a mask over the used slots"""
+        # Most calls per tick have nothing to release
+        if getattr(slots, 'dtype', None) == bool:
+            if not slots.any():
+                return
+            slots = np.flatnonzero(slots)
+        elif len(slots) == 0:
+            return
+        else:
+            slots = np.unique(slots)
+        slots = slots[self.alive[slots]]
+        n = len(slots)
+        if n == 0:
+            return
+        self.alive[slots] = False
+        # Parked slots stand still, so move() leaves their bytes alone
+        self.speed[slots] = 0
+        self.free[self.free_count:self.free_count + n] = slots
+        self.free_count += n
+        self.released += n
+
+    # Dying is just going back to the pool
+    kill = release
+
+    def add(self, x, y, w, h, speed, points=0, kind=0):
+        """Add one entity and return its slot index"""
+        if self.free_count:
+            self.free_count -= 1
+            i = int(self.free[self.free_count])
+        else:
+            self._reserve(self.count + 1)
+            i = self.count
+            self.count += 1
+        self.x[i] = x
+        self.y[i] = y
+        self.w[i] = w
+        self.h[i] = h
+        self.speed[i] = speed
+        self.points[i] = points
+        self.kind[i] = kind
+        self.alive[i] = True
+        self.serial[i] = self.next_serial
+        self.next_serial += 1
+        self.acquired += 1
+        self.peak = max(self.peak, len(self))
+        return i
+
+    def add_many(self, x, y, w, h, speed, points=0, kind=0):
+        """Add a batch of entities; arguments may be arrays or scalars. Returns the slots"""
+        slots = self.acquire(len(x))
+        self.x[slots] = x
+        self.y[slots] = y
+        self.w[slots] = w
+        self.h[slots] = h
+        self.speed[slots] = speed
+        self.points[slots] = points
+        self.kind[slots] = kind
+        return slots
+
+    def active(self):
+        """Slot indices of the living entities"""
+        return np.flatnonzero(self.alive[:self.count])
+
+    def in_order(self, slots):
+        """The given slots sorted by when they were acquired"""
+        return slots[np.argsort(self.serial[slots], kind='stable')]
+
+    def move(self):
+        """Step every used slot by its speed; released slots have none"""
+        n = self.count
+        self.y[:n] += self.speed[:n]
+
+    def dump(self):
+        """(RECORD array of the used slots, free slot stack, next serial): the exact pool layout"""
+        n = self.count
+        records = np.empty(n, dtype=RECORD)
+        for name in RECORD.names:
+            records[name] = getattr(self, name)[:n]
+        return records, self.free[:self.free_count].copy(), self.next_serial
+
+    def restore(self, records, free, next_serial):
+        """Put back a layout from dump(), slot for slot"""
+        n = len(records)
+        self._reserve(n)
+        for name in RECORD.names:
+            getattr(self, name)[:n] = records[name]
+        self.alive[n:max(self.count, n)] = False
+        self.count = n
+        self.free[:len(free)] = free
+        self.free_count = len(free)
+        self.next_serial = next_serial
+
+    def clear(self):
+        """Release every slot; the arrays keep their capacity"""
+        self.released += len(self)
+        self.alive[:self.count] = False
+        self.count = 0
+        self.free_count = 0
+
+    # Vectorized off-screen handling
+
+    def below(self, limit):
+        """Mask of living entities whose top edge is past limit"""
+        n = self.count
+        return self.alive[:n] & (self.y[:n] > limit)
+
+    def above(self, limit):
+        """Mask of living entities whose bottom edge is above limit"""
+        n = self.count
+        return self.alive[:n] & (self.y[:n] + self.h[:n] < limit)
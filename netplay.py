@@ -0,0 +1,527 @@
+"""Authoritative game server with pilot and spectator clients over a local socket.
+
+The server owns the only real Simulation and steps it at the game's tick
+rate. Clients connect over TCP (on the loopback interface by default) and
+only ever send their input together with the number of the last snapshot
+they received. Every tick, each client gets a snapshot (see snapshot.py)
+delta-encoded against the snapshot it last acknowledged; clients that
+acknowledged the same one share a single encoding. A client whose socket
+is backed up is skipped for a tick instead of queueing more, which is safe
+because its next delta is still built on what it acknowledged.
+
+The game has one ship, so the first client asking to fly it is the pilot
+and everyone else spectates. When a game ends the server shows the result
+for a few seconds and starts the next one.
+
+    python netplay.py serve --port 5555 [--waves waves/swarm.json]
+    python netplay.py bot 127.0.0.1:5555 --role pilot
+    python alien_invasion.py --connect 127.0.0.1:5555 [--spectate]
+    python netplay.py selftest         # server and bots in one process
+"""
+import argparse
+import json
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import snapshot
+from policies import POLICIES
+from simulation import ACTION_FIRE, GameConfig, Simulation, GAME
+from sprites import config_masks
+from waves import WaveScript
+
+PROTOCOL = 1
+# Every message: payload length, message type
+_FRAME = struct.Struct('<IB')
+MSG_HELLO = 1     # client -> server: JSON {'protocol', 'role'}
+MSG_WELCOME = 2   # server -> client: JSON {'role', 'config'}
+MSG_INPUT = 3     # client -> server: _INPUT
+MSG_SNAPSHOT = 4  # server -> client: snapshot.encode() output
+# Last snapshot frame received (snapshot.NO_BASE for none yet), action flags
+_INPUT = struct.Struct('<IB')
+MAX_MESSAGE = 1 << 24
+
+
+class Connection:
+    """Length-prefixed messages over a non-blocking socket"""
+    def __init__(self, sock):
+        self.sock = sock
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.closed = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def send(self, kind, payload):
+        self.outgoing += _FRAME.pack(len(payload), kind)
+        self.outgoing += payload
+        self.flush()
+
+    def flush(self):
+        """Write as much of the queued data as the socket takes without blocking"""
+        while self.outgoing and not self.closed:
+            try:
+                sent = self.sock.send(self.outgoing)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.closed = True
+                return
+            del self.outgoing[:sent]
+            self.bytes_sent += sent
+
+    def receive(self):
+        """(kind, payload) of every message that has fully arrived"""
+        while not self.closed:
+            try:
+                data = self.sock.recv(1 << 16)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b''
+            if not data:
+                self.closed = True
+                break
+            self.incoming += data
+            self.bytes_received += len(data)
+        messages = []
+        offset = 0
+        while len(self.incoming) - offset >= _FRAME.size:
+            length, kind = _FRAME.unpack_from(self.incoming, offset)
+            if length > MAX_MESSAGE:
+                self.closed = True
+                break
+            end = offset + _FRAME.size + length
+            if len(self.incoming) < end:
+                break
+            messages.append((kind, bytes(self.incoming[offset + _FRAME.size:end])))
+            offset = end
+        del self.incoming[:offset]
+        return messages
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+
+
+class _Client:
+    """Server-side state of one connection"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.role = None  # Until the client says hello
+        self.acked = snapshot.NO_BASE
+        self.snapshots = 0
+        self.snapshot_bytes = 0
+        self.skipped = 0
+
+
+class GameServer:
+    """Runs the authoritative game and streams it to connected clients"""
+    def __init__(self, config=None, seed=None, host='127.0.0.1', port=0, waves=None,
+                 history=64, max_backlog=1 << 20, restart_seconds=3.0):
+        config = config or GameConfig()
+        # Pixel-accurate hits, the same as in a local game
+        self.sim = Simulation(config, seed=seed, waves=waves, masks=config_masks(config))
+        self.sim.reset()
+        self.frame = 0
+        # Recent snapshots by frame: the bases clients may have acknowledged
+        self.history = OrderedDict()
+        self.history_size = history
+        self.max_backlog = max_backlog  # Bytes queued for a client before its snapshots are skipped
+        self.restart_ticks = self.sim.config.ticks(restart_seconds * 60)
+        self.ended = 0  # Ticks since the current game ended
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()[:2]
+        self.clients = []
+        self.pilot = None
+        self.actions = 0  # Latest input from the pilot, with fire held until a tick uses it
+        self.running = False
+
+    def poll(self):
+        """Accept new clients and handle everything clients have sent"""
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except BlockingIOError:
+                break
+            self.clients.append(_Client(Connection(sock)))
+        for client in list(self.clients):
+            try:
+                for kind, payload in client.connection.receive():
+                    if kind == MSG_HELLO and client.role is None:
+                        self.welcome(client, json.loads(payload))
+                    elif kind == MSG_INPUT and client.role is not None:
+                        client.acked, actions = _INPUT.unpack(payload)
+                        if client is self.pilot:
+                            # A shot is one tick's input; a release sent right after it must not lose it
+                            self.actions = actions | (self.actions & ACTION_FIRE)
+            except (ValueError, struct.error):
+                # A malformed message only costs the client that sent it
+                client.connection.close()
+            if client.connection.closed:
+                self.disconnect(client)
+
+    def welcome(self, client, hello):
+        if not isinstance(hello, dict) or hello.get('protocol') != PROTOCOL:
+            client.connection.close()
+            return
+        if hello.get('role') == 'pilot' and self.pilot is None:
+            client.role = 'pilot'
+            self.pilot = client
+        else:
+            client.role = 'spectator'
+        client.connection.send(MSG_WELCOME, json.dumps({
+            'role': client.role,
+            'config': self.sim.config.to_dict(),
+        }).encode())
+
+    def disconnect(self, client):
+        client.connection.close()
+        if client not in self.clients:
+            return
+        self.clients.remove(client)
+        if client is self.pilot:
+            self.pilot = None
+            self.actions = 0
+
+    def tick(self):
+        """Step the game once and send every client its snapshot"""
+        sim = self.sim
+        if sim.state == GAME:
+            sim.step(self.actions)
+            self.actions &= ~ACTION_FIRE
+        else:
+            # Show the result for a while, then start the next game
+            self.ended += 1
+            if self.ended >= self.restart_ticks:
+                self.ended = 0
+                sim.reset()
+
+        self.frame += 1
+        current = snapshot.capture(sim, self.frame)
+        self.history[self.frame] = current
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+
+        encoded = {}  # Base frame -> bytes
+        for client in self.clients:
+            if client.role is None:
+                continue
+            connection = client.connection
+            connection.flush()
+            if len(connection.outgoing) > self.max_backlog:
+                client.skipped += 1
+                continue
+            base = self.history.get(client.acked)
+            key = client.acked if base is not None else None
+            data = encoded.get(key)
+            if data is None:
+                data = encoded[key] = snapshot.encode(current, base)
+            connection.send(MSG_SNAPSHOT, data)
+            client.snapshots += 1
+            client.snapshot_bytes += len(data)
+
+    def serve_forever(self, ticks=None):
+        """Run at the game's tick rate until stop() (or for a number of ticks)"""
+        step = 1 / self.sim.config.tick_rate
+        next_tick = time.perf_counter()
+        self.running = True
+        while self.running and (ticks is None or self.frame < ticks):
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                # Wake up early for new connections and input
+                sockets = [self.listener] + [client.connection.sock for client in self.clients]
+                select.select(sockets, [], [], delay)
+                self.poll()
+                continue
+            self.poll()
+            self.tick()
+            next_tick += step
+            # After a long stall, carry on from now instead of racing to catch up
+            if time.perf_counter() - next_tick > 0.25:
+                next_tick = time.perf_counter()
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        return [{
+            'role': client.role,
+            'snapshots': client.snapshots,
+            'bytes_per_snapshot': client.snapshot_bytes / max(client.snapshots, 1),
+            'skipped': client.skipped,
+        } for client in self.clients if client.role is not None]
+
+    def close(self):
+        for client in list(self.clients):
+            self.disconnect(client)
+        self.listener.close()
+
+
+class GameClient:
+    """Connection to a GameServer: sends input, receives and decodes snapshots"""
+    def __init__(self, address, role='spectator', timeout=5.0, history=64):
+        self.connection = Connection(socket.create_connection(address, timeout))
+        self.connection.send(MSG_HELLO, json.dumps({'protocol': PROTOCOL, 'role': role}).encode())
+        welcome = json.loads(self._wait(MSG_WELCOME, timeout))
+        self.role = welcome['role']
+        self.config = GameConfig.from_dict(welcome['config'])
+        # Recent snapshots by frame; the server encodes against the one acknowledged last
+        self.snapshots = OrderedDict()
+        self.history_size = history
+        self.snapshot = None
+        self.actions = 0
+
+    def _wait(self, kind, timeout):
+        deadline = time.perf_counter() + timeout
+        while not self.connection.closed:
+            for message_kind, payload in self.connection.receive():
+                if message_kind == kind:
+                    return payload
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            select.select([self.connection.sock], [], [], remaining)
+        raise ConnectionError("No answer from the game server")
+
+    @property
+    def closed(self):
+        return self.connection.closed
+
+    def poll(self, actions=None):
+        """Decode the snapshots that arrived and send input; returns the newest new snapshot or None.
+
+        An input message goes out when the actions change or a snapshot has
+        to be acknowledged, so a quiet spectator sends one small message
+        per tick at most.
+        """
+        newest = None
+        for kind, payload in self.connection.receive():
+            if kind != MSG_SNAPSHOT:
+                continue
+            frame, base_frame = snapshot.peek(payload)
+            base = self.snapshots.get(base_frame)
+            if base_frame != snapshot.NO_BASE and base is None:
+                continue  # Never happens unless history is shorter than the server's
+            newest = snapshot.decode(payload, base)
+            self.snapshots[frame] = newest
+            while len(self.snapshots) > self.history_size:
+                self.snapshots.popitem(last=False)
+        if newest is not None:
+            self.snapshot = newest
+        changed = actions is not None and actions != self.actions
+        if changed:
+            self.actions = actions
+        if newest is not None or changed:
+            acked = self.snapshot.frame if self.snapshot is not None else snapshot.NO_BASE
+            self.connection.send(MSG_INPUT, _INPUT.pack(acked, self.actions))
+        return newest
+
+    def close(self):
+        self.connection.close()
+
+
+def run_bot(address, role='pilot', ticks=600, policy='tracker', verify=None, timeout=5.0):
+    """Stand-in client: plays (or watches) with a policies.py policy on a mirrored Simulation.
+
+    Stops once the server has run `ticks` ticks, or has sent nothing for
+    `timeout` seconds. verify(snapshot) is called with the newest snapshot
+    after every poll. Returns the client.
+    """
+    client = GameClient(address, role)
+    mirror = Simulation(client.config)
+    mirror.reset(0)
+    choose = POLICIES[policy](0)
+    step = 1 / client.config.tick_rate
+    last_received = time.perf_counter()
+    while not client.closed and (client.snapshot is None or client.snapshot.frame < ticks):
+        select.select([client.connection.sock], [], [], step)
+        newest = client.poll(choose(mirror) if client.role == 'pilot' else 0)
+        if newest is None:
+            if time.perf_counter() - last_received > timeout:
+                break
+        else:
+            last_received = time.perf_counter()
+            snapshot.apply(newest, mirror)
+            if verify:
+                verify(newest)
+    return client
+
+
+def check_bad_clients(timeout=5.0):
+    """Clients sending a bad hello or a truncated input are dropped, and the game goes on for the rest"""
+    server = GameServer(GameConfig(), seed=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    good = GameClient(server.address, 'pilot')
+
+    def message(kind, payload):
+        return _FRAME.pack(len(payload), kind) + payload
+
+    hello = json.dumps({'protocol': PROTOCOL, 'role': 'spectator'}).encode()
+    sent = [
+        message(MSG_HELLO, json.dumps({'protocol': PROTOCOL + 1, 'role': 'pilot'}).encode()),
+        message(MSG_HELLO, b'{"protocol": '),
+        message(MSG_HELLO, b'[1, 2, 3]'),
+        message(MSG_HELLO, hello) + message(MSG_INPUT, b'\x00\x00'),
+        message(MSG_HELLO, hello) + message(MSG_INPUT, bytes(_INPUT.size + 1)),
+    ]
+    for data in sent:
+        sock = socket.create_connection(server.address, timeout)
+        sock.sendall(data)
+        # The server hangs up on each of them
+        try:
+            while sock.recv(1 << 16):
+                pass
+        except OSError:
+            pass
+        sock.close()
+
+    deadline = time.perf_counter() + timeout
+    received = None
+    while received is None and time.perf_counter() < deadline:
+        select.select([good.connection.sock], [], [], 0.05)
+        received = good.poll(0)
+    ok = thread.is_alive() and received is not None and len(server.clients) == 1
+    server.stop()
+    thread.join()
+    good.close()
+    server.close()
+    return ok
+
+
+def check_fire_between_ticks(timeout=5.0):
+    """A shot the pilot releases again before the next tick still fires"""
+    server = GameServer(GameConfig(), seed=0)
+    clients = []
+    joining = threading.Thread(target=lambda: clients.append(GameClient(server.address, 'pilot', timeout)))
+    joining.start()
+    deadline = time.perf_counter() + timeout
+    while joining.is_alive() and time.perf_counter() < deadline:
+        server.poll()
+        time.sleep(0.001)
+    joining.join()
+    if not clients or server.pilot is None:
+        server.close()
+        return False
+    pilot = clients[0]
+    connection = server.pilot.connection
+    expected = connection.bytes_received + 2 * (_FRAME.size + _INPUT.size)
+    pilot.poll(ACTION_FIRE)
+    pilot.poll(0)
+    while connection.bytes_received < expected and time.perf_counter() < deadline:
+        select.select([connection.sock], [], [], 0.05)
+        server.poll()
+    server.tick()
+    fired = len(server.sim.bullets) == 1
+    server.tick()
+    # The shot is used up: no second bullet from the same press
+    ok = fired and len(server.sim.bullets) == 1
+    pilot.close()
+    server.close()
+    return ok
+
+
+def selftest(ticks=600, spectators=3, waves=None, seed=0, lives=3):
+    """Server plus one pilot and some spectator bots; every snapshot is checked against the server"""
+    if not check_bad_clients():
+        print("a malformed message took the server down or kept a bad client connected")
+        return 1
+    print("malformed messages only dropped the clients that sent them")
+    if not check_fire_between_ticks():
+        print("a shot released again before the next tick was lost")
+        return 1
+    print("a shot released before the next tick still fired")
+    server = GameServer(GameConfig(max_lives=lives), seed=seed, waves=WaveScript(waves) if waves else None,
+                        history=ticks + 64)
+    thread = threading.Thread(target=server.serve_forever, args=(ticks + 30,), daemon=True)
+    thread.start()
+    mismatches = []
+
+    def verify(received):
+        if server.history.get(received.frame) != received:
+            mismatches.append(received.frame)
+
+    results = []
+    bots = [threading.Thread(target=lambda role=role: results.append(run_bot(server.address, role, ticks, verify=verify)))
+            for role in ['pilot'] + ['spectator'] * spectators]
+    for bot in bots:
+        bot.start()
+    for bot in bots:
+        bot.join()
+    stats = server.stats()
+    server.stop()
+    thread.join()
+
+    frames = list(server.history.values())
+    full = sum(len(snapshot.encode(frame)) for frame in frames) / max(len(frames), 1)
+    peak = max((len(frame.entities['enemies']) + len(frame.entities['bullets']) for frame in frames), default=0)
+    print(f"{len(frames)} ticks, up to {peak} enemies and bullets, full snapshot {full:,.0f} bytes on average")
+    for client in stats:
+        print(f"  {client['role']:<9} {client['snapshots']} snapshots, {client['bytes_per_snapshot']:,.0f} bytes each "
+              f"({client['bytes_per_snapshot'] * server.sim.config.tick_rate / 1024:,.1f} KiB/s), "
+              f"{client['skipped']} skipped")
+    for client in results:
+        client.close()
+    server.close()
+    if mismatches:
+        print(f"{len(mismatches)} snapshots differ from the server, first at frame {mismatches[0]}")
+        return 1
+    print("every snapshot matched the server")
+    return 0
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alien Invasion game server and test clients")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="run a game server")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=5555)
+    serve.add_argument('--seed', type=int)
+    serve.add_argument('--waves', metavar='PATH', help="swarm mode wave script")
+    bot = commands.add_parser('bot', help="connect a stand-in client")
+    bot.add_argument('address', help="HOST:PORT")
+    bot.add_argument('--role', choices=('pilot', 'spectator'), default='pilot')
+    bot.add_argument('--ticks', type=int, default=3600)
+    bot.add_argument('--policy', default='tracker')
+    test = commands.add_parser('selftest', help="server and bots in one process, checking every snapshot")
+    test.add_argument('--ticks', type=int, default=600)
+    test.add_argument('--spectators', type=int, default=3)
+    test.add_argument('--waves', metavar='PATH')
+    test.add_argument('--lives', type=int, default=3, help="more lives keep a swarm game going")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        server = GameServer(seed=args.seed, host=args.host, port=args.port,
+                            waves=WaveScript(args.waves) if args.waves else None)
+        print(f"Serving on {server.address[0]}:{server.address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+    elif args.command == 'bot':
+        client = run_bot(parse_address(args.address), args.role, args.ticks, args.policy)
+        print(f"{client.role}: {len(client.snapshots)} snapshots kept, "
+              f"{client.connection.bytes_received:,} bytes received")
+        client.close()
+    else:
+        return selftest(args.ticks, args.spectators, args.waves, lives=args.lives)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Batched particle effects for the pygame front end.
+
+Particles are purely visual and never touch the game rules. Positions,
+velocities, ages, lifetimes and colors live in preallocated NumPy arrays
+with the living particles packed at the front, so a tick is a handful of
+vectorized operations no matter how many particles there are, and there is
+no Python object per particle. The pool has a hard capacity (and a limit
+that can be set lower); bursts that do not fit are cut short rather than
+growing it.
+
+Drawing uses a small palette surface holding one square per color and fade
+level, so every particle is an (image, position, area) entry that goes out
+in the same Surface.blits call as the sprites.
+"""
+from itertools import repeat
+
+import numpy as np
+import pygame
+
+
+class ParticleSystem:
+    """Fixed-capacity pool of fading, drifting square particles"""
+    def __init__(self, colors, capacity=2048, fade_levels=6, gravity=0.0, drag=2.0, seed=None):
+        self.colors = list(colors)  # Palette; particles refer to colors by index
+        self.capacity = capacity
+        self.limit = capacity  # Most particles alive at once, up to capacity; lowered for speed
+        self.fade_levels = fade_levels
+        self.gravity = gravity  # Pixels per second squared, downwards
+        self.drag = drag        # Fraction of velocity lost per second
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.age = np.zeros(capacity, dtype=np.float32)
+        self.life = np.ones(capacity, dtype=np.float32)
+        self.color = np.zeros(capacity, dtype=np.int16)
+        self.dropped = 0  # Particles that did not fit
+        self.surface = None
+        self.areas = []
+        self.size = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def build(self, size):
+        """Palette surface for particles of size x size pixels; needs a display"""
+        levels = self.fade_levels
+        palette = pygame.Surface((size * levels, size * len(self.colors)), pygame.SRCALPHA, 32)
+        self.areas = []
+        for row, color in enumerate(self.colors):
+            for level in range(levels):
+                # Level 0 is a fresh particle, the last level almost gone
+                rect = pygame.Rect(level * size, row * size, size, size)
+                palette.fill((*color[:3], 255 * (levels - level) // levels), rect)
+                self.areas.append(rect)
+        self.surface = palette.convert_alpha()
+        self.size = size
+
+    def emit(self, x, y, count, color, speed=(60, 240), life=(0.3, 0.8), angle=(0, 2 * np.pi)):
+        """Send `count` particles out of every point (x[i], y[i]).
+
+        speed is in pixels per second, life in seconds and angle in radians
+        (0 points right, pi / 2 down); each is a (low, high) range to pick
+        from. color is a palette index or an array of one per point.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float32))
+        total = len(x) * count
+        room = min(self.limit, self.capacity) - self.count
+        if total > room:
+            self.dropped += total - room
+            total = room
+        if total <= 0:
+            return
+        rng = self.rng
+        new = slice(self.count, self.count + total)
+        origin = np.repeat(np.arange(len(x)), count)[:total]
+        direction = rng.uniform(*angle, total)
+        velocity = rng.uniform(*speed, total)
+        self.x[new] = x[origin]
+        self.y[new] = np.broadcast_to(np.asarray(y, dtype=np.float32), x.shape)[origin]
+        self.vx[new] = np.cos(direction) * velocity
+        self.vy[new] = np.sin(direction) * velocity
+        self.age[new] = 0
+        self.life[new] = rng.uniform(*life, total)
+        self.color[new] = np.broadcast_to(color, x.shape)[origin]
+        self.count += total
+
+    def update(self, dt):
+        """Move every particle by dt seconds and drop the ones that have faded out"""
+        n = self.count
+        if n == 0:
+            return
+        vx, vy = self.vx[:n], self.vy[:n]
+        damping = max(1.0 - self.drag * dt, 0.0)
+        vx *= damping
+        vy *= damping
+        vy += self.gravity * dt
+        self.x[:n] += vx * dt
+        self.y[:n] += vy * dt
+        age = self.age[:n]
+        age += dt
+        alive = age < self.life[:n]
+        if alive.all():
+            return
+        # Pack the survivors at the front, keeping their order
+        keep = np.flatnonzero(alive)
+        for array in (self.x, self.y, self.vx, self.vy, self.age, self.life, self.color):
+            array[:len(keep)] = array[keep]
+        self.count = len(keep)
+
+    def blits(self, dt=0.0):
+        """(image, position, area) for every particle, dt seconds back along its path"""
+        n = self.count
+        if n == 0 or self.surface is None:
+            return []
+        half = self.size // 2
+        x = (self.x[:n] - self.vx[:n] * dt).astype(int) - half
+        y = (self.y[:n] - self.vy[:n] * dt).astype(int) - half
+        level = np.minimum(self.age[:n] / self.life[:n] * self.fade_levels, self.fade_levels - 1).astype(int)
+        areas = self.color[:n] * self.fade_levels + level
+        return zip(repeat(self.surface), zip(x.tolist(), y.tolist()), map(self.areas.__getitem__, areas.tolist()))
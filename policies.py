@@ -0,0 +1,52 @@
+"""Scripted players for headless games: each takes a seed and returns policy(sim) -> actions.
+
+Used by the balance sweeps (sweep.py) and the stand-in network clients
+(netplay.py).
+"""
+import numpy as np
+
+from simulation import ACTION_LEFT, ACTION_RIGHT, ACTION_FIRE
+
+
+def random_policy(seed):
+    """Presses random keys every tick"""
+    choices = np.array([0, ACTION_LEFT, ACTION_RIGHT, ACTION_FIRE,
+                        ACTION_LEFT | ACTION_FIRE, ACTION_RIGHT | ACTION_FIRE])
+    rng = np.random.default_rng(seed)
+    # Draw in blocks; one generator call per tick would dominate the game itself
+    buffer = []
+
+    def policy(sim):
+        if not buffer:
+            buffer.extend(choices[rng.integers(len(choices), size=1024)].tolist())
+        return buffer.pop()
+    return policy
+
+
+def tracker_policy(seed):
+    """Keeps firing while moving under the enemy closest to the bottom"""
+    def policy(sim):
+        enemies = sim.enemies
+        active = enemies.active()
+        if len(active) == 0:
+            return ACTION_FIRE
+        target = active[np.argmax(enemies.y[active])]
+        center = enemies.x[target] + enemies.w[target] / 2
+        if center < sim.player.rect.centerx - sim.player.speed:
+            return ACTION_FIRE | ACTION_LEFT
+        if center > sim.player.rect.centerx + sim.player.speed:
+            return ACTION_FIRE | ACTION_RIGHT
+        return ACTION_FIRE
+    return policy
+
+
+def idle_policy(seed):
+    """Never moves or fires"""
+    return lambda sim: 0
+
+
+POLICIES = {
+    'random': random_policy,
+    'tracker': tracker_policy,
+    'idle': idle_policy,
+}
@@ -0,0 +1,144 @@
+"""Downloads of the game's images and font, ahead of time or in the background.
+
+The game never waits for the network. It starts with whatever is already in
+game_images/ and draws built-in stand-ins (plain shapes, pygame's bundled
+font) for anything missing, while a Prefetch fetches the missing files on
+background threads, all at once. urllib and the TLS setup are loaded on one
+of those threads too, so they cost the main thread nothing. Every download
+has a timeout and is written under a temporary name first, so a failed or
+cancelled download never leaves a torn file behind. cancel() stops all of
+them at the next chunk; the threads are daemons, so quitting never waits
+for the network.
+
+Fetch everything before playing (for kiosks, or to warm a machine image):
+
+    python prefetch.py
+    python prefetch.py --timeout 3 --force
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+ASSET_DIR = 'game_images'
+
+# File name under ASSET_DIR -> where to get it
+ASSETS = {
+    'spaceship.png': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/player.png',
+    'alien1.png': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/red.png',
+    'alien2.png': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/green.png',
+    'alien3.png': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/yellow.png',
+    'bullet.png': 'https://cdn-icons-png.flaticon.com/512/5610/5610944.png',
+    'background.png': 'https://img.freepik.com/premium-vector/space-game-background-neon-night-alien-landscape_107791-1624.jpg',
+    'powerup.png': 'https://raw.githubusercontent.com/clear-code-projects/Space-invaders/main/graphics/extra.png',
+    'heart_powerup.png': 'https://cdn-icons-png.flaticon.com/512/833/833472.png',
+    'game_font.ttf': 'https://github.com/google/fonts/raw/main/ofl/pressstart2p/PressStart2P-Regular.ttf',
+}
+
+_CHUNK = 64 * 1024
+
+
+def asset_path(name):
+    return os.path.join(ASSET_DIR, name)
+
+
+def missing():
+    """Names of the assets not on disk yet"""
+    return [name for name in ASSETS if not os.path.exists(asset_path(name))]
+
+
+class Prefetch:
+    """Concurrent, cancellable download of assets, one daemon thread each"""
+    def __init__(self, names=None, timeout=5.0):
+        self.names = missing() if names is None else list(names)
+        self.timeout = timeout  # Seconds per connection attempt and per read
+        self.cancelled = threading.Event()
+        self.fetched = []  # Names written to disk
+        self.failed = {}   # Name -> error message
+        self.started = None
+        self.finished = None
+        self._thread = None
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='prefetch', daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop every download at its next chunk; nothing more is written"""
+        self.cancelled.set()
+
+    def wait(self, timeout=None):
+        """Block until every download has finished or failed; False if timeout ran out first"""
+        self._thread.join(timeout)
+        return self.done
+
+    def _run(self):
+        import ssl
+        import urllib.request
+        # One TLS context for all downloads; building one loads every CA certificate
+        context = ssl.create_default_context()
+        threads = [threading.Thread(target=self._fetch, args=(urllib.request, context, name),
+                                    name=f'prefetch-{name}', daemon=True)
+                   for name in self.names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.finished = time.perf_counter()
+
+    def _fetch(self, request, context, name):
+        try:
+            chunks = []
+            with request.urlopen(ASSETS[name], timeout=self.timeout, context=context) as response:
+                while not self.cancelled.is_set():
+                    chunk = response.read(_CHUNK)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            if self.cancelled.is_set():
+                return
+            path = asset_path(name)
+            os.makedirs(ASSET_DIR, exist_ok=True)
+            temp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(b''.join(chunks))
+            os.replace(temp_path, path)
+            self.fetched.append(name)
+        except Exception as e:
+            self.failed[name] = str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the game's images and font")
+    parser.add_argument('--timeout', type=float, default=10.0, help="seconds per connection and read (default 10)")
+    parser.add_argument('--force', action='store_true', help="download assets that are already on disk too")
+    args = parser.parse_args()
+
+    prefetch = Prefetch(list(ASSETS) if args.force else None, timeout=args.timeout)
+    if not prefetch.names:
+        print("All assets are on disk")
+        return
+    prefetch.start()
+    try:
+        prefetch.wait()
+    except KeyboardInterrupt:
+        prefetch.cancel()
+        print("Cancelled")
+        sys.exit(1)
+    for name in prefetch.fetched:
+        print(f"Downloaded {name}")
+    for name, error in prefetch.failed.items():
+        print(f"Failed to download {name}: {error}")
+    print(f"{len(prefetch.fetched)} of {len(prefetch.names)} assets in {prefetch.finished - prefetch.started:.2f}s")
+    sys.exit(1 if prefetch.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Per-phase frame timing for the game loop.
+
+Code marks its phases with ``with profiler.phase('name'):``. While profiling
+is disabled, phase() hands back one shared do-nothing context manager, so
+the instrumentation costs a method call per phase and nothing else. When
+enabled, frame phase timings and entity counts are kept for rolling
+percentiles, the on-screen overlay and a JSON/CSV export at the end of the
+session; only a profiler that will be exported keeps every frame, others
+just the last `window` of them.
+
+StartupTimeline records how long each step of startup took, up to the first
+frame on screen, so time to first frame can be reported and held to a budget.
+"""
+import csv
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Phase:
+    __slots__ = ('name', 'profiler', 'start')
+
+    def __init__(self, name, profiler):
+        self.name = name
+        self.profiler = profiler
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        frame = self.profiler.frame
+        frame[self.name] = frame.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class FrameProfiler:
+    """Collects phase timings (ms) and entity counts per frame"""
+    def __init__(self, enabled=False, window=600, keep_history=True):
+        self.enabled = enabled
+        self.window = window  # Frames used for the rolling percentiles
+        self.frame = {}
+        self.counts = {}
+        # Every frame for export, or only the recent ones for the overlay
+        self.history = [] if keep_history else deque(maxlen=window)
+        self.frames = 0  # Frames recorded so far
+        self.recent = {}
+        self._phases = {}
+        self._last_frame_end = None
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase(name, self)
+        return phase
+
+    def sample(self, name, seconds):
+        """Add a duration measured outside of a phase (such as input latency) to this frame"""
+        if self.enabled:
+            self.frame[name] = self.frame.get(name, 0.0) + seconds
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counts[name] = value
+
+    def end_frame(self):
+        """Close the current frame and start the next one"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        timings = {name: seconds * 1000 for name, seconds in self.frame.items()}
+        if self._last_frame_end is not None:
+            timings['frame'] = (now - self._last_frame_end) * 1000
+        self._last_frame_end = now
+        for name, ms in timings.items():
+            recent = self.recent.get(name)
+            if recent is None:
+                recent = self.recent[name] = deque(maxlen=self.window)
+            recent.append(ms)
+        self.history.append((timings, dict(self.counts)))
+        self.frames += 1
+        self.frame.clear()
+
+    def percentiles(self):
+        """Rolling {phase: (p50, p95, p99)} in milliseconds"""
+        return {name: tuple(np.percentile(np.fromiter(values, dtype=float, count=len(values)), (50, 95, 99)))
+                for name, values in self.recent.items() if values}
+
+    def export(self, path):
+        """Write every recorded frame to a .json or .csv file"""
+        phases = sorted({name for timings, _ in self.history for name in timings})
+        counters = sorted({name for _, counts in self.history for name in counts})
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['frame'] + [f"{name}_ms" for name in phases] + counters)
+                for index, (timings, counts) in enumerate(self.history):
+                    writer.writerow([index] + [round(timings.get(name, 0.0), 4) for name in phases] +
+                                    [counts.get(name, '') for name in counters])
+        else:
+            summary = {name: dict(zip(('p50', 'p95', 'p99'), values))
+                       for name, values in self.percentiles().items()}
+            with open(path, 'w') as f:
+                json.dump({
+                    'frames': len(self.history),
+                    'summary_ms': summary,
+                    'phases_ms': {name: [round(timings.get(name, 0.0), 4) for timings, _ in self.history]
+                                  for name in phases},
+                    'counts': {name: [counts.get(name) for _, counts in self.history] for name in counters},
+                }, f)
+
+    def overlay_lines(self):
+        """Text lines for the on-screen overlay"""
+        lines = [f"{'ms':<11}{'p50':>6}{'p95':>7}{'p99':>7}"]
+        for name, (p50, p95, p99) in sorted(self.percentiles().items()):
+            lines.append(f"{name:<11}{p50:6.2f}{p95:7.2f}{p99:7.2f}")
+        if self.counts:
+            lines.append("  ".join(f"{name} {value}" for name, value in sorted(self.counts.items())))
+        return lines
+
+
+# Shared disabled profiler for code that was not given one
+NULL_PROFILER = FrameProfiler(enabled=False)
+
+
+class StartupTimeline:
+    """Named milestones from process start to the first frame, in milliseconds"""
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.marks = []  # (name, ms since start)
+
+    def mark(self, name):
+        self.marks.append((name, (time.perf_counter() - self.start) * 1000))
+
+    def elapsed(self, name):
+        """ms from start to the milestone, or None if it was not reached"""
+        return next((ms for mark, ms in self.marks if mark == name), None)
+
+    def report(self):
+        """Lines of milestone, time since the previous one and total"""
+        lines = [f"{'startup':<16}{'step ms':>9}{'total ms':>10}"]
+        previous = 0.0
+        for name, ms in self.marks:
+            lines.append(f"{name:<16}{ms - previous:9.1f}{ms:10.1f}")
+            previous = ms
+        return lines
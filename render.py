@@ -0,0 +1,356 @@
+"""Rendering helpers for the pygame front end."""
+import math
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pygame
+
+
+class DirtyRectRenderer:
+    """Redraws and pushes only the screen regions that changed since the last frame.
+
+    Every blit made through the renderer is remembered. On the next frame those
+    regions are restored from the background before anything new is drawn, and
+    only the old and new regions are sent to the display. When the changed
+    area gets large, when there are too many regions to track cheaply (or
+    after invalidate()) it falls back to a full blit + flip.
+    """
+    def __init__(self, enabled=True, max_dirty_fraction=0.35, max_rects=1000):
+        self.enabled = enabled
+        self.max_dirty_fraction = max_dirty_fraction
+        self.max_rects = max_rects
+        self.previous = []  # Rects drawn last frame
+        self.current = []   # Rects drawn this frame
+        self.full_redraw = True
+        self.screen = None
+
+    def invalidate(self):
+        """Force the next frame to redraw and flip the whole screen"""
+        self.full_redraw = True
+
+    def _area(self, rects):
+        return sum(rect.width * rect.height for rect in rects)
+
+    def begin(self, screen, background):
+        """Erase last frame's sprites by restoring the background under them"""
+        self.screen = screen
+        self.previous, self.current = self.current, self.previous
+        self.current.clear()
+        limit = screen.get_width() * screen.get_height() * self.max_dirty_fraction
+        if (not self.enabled or self.full_redraw or len(self.previous) > self.max_rects
+                or self._area(self.previous) > limit):
+            self.full_redraw = True
+            screen.blit(background, (0, 0))
+        else:
+            screen.blits([(background, rect, rect) for rect in self.previous], doreturn=False)
+
+    def blit(self, image, position):
+        self.current.append(self.screen.blit(image, position))
+
+    def blits(self, sequence):
+        """Draw a whole list of (image, position[, area]) in one Surface.blits call"""
+        self.current.extend(self.screen.blits(sequence))
+
+    def present(self, window=None):
+        """Send this frame to the display.
+
+        With window, the frame was drawn on an offscreen surface of another
+        size; it is scaled to the window as a whole and flipped.
+        """
+        if window is not None:
+            pygame.transform.scale(self.screen, window.get_size(), window)
+            pygame.display.flip()
+            self.full_redraw = False
+            return
+        limit = self.screen.get_width() * self.screen.get_height() * self.max_dirty_fraction
+        if (self.full_redraw or len(self.previous) + len(self.current) > self.max_rects
+                or self._area(self.previous) + self._area(self.current) > limit):
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.previous + self.current)
+        self.full_redraw = False
+
+
+# Colorkeys to try for atlases without partial transparency
+_COLORKEYS = ((255, 0, 255), (0, 255, 255), (1, 2, 3), (254, 1, 253))
+
+
+class SpriteAtlas:
+    """Packs named sprite images into one display-format surface.
+
+    Every sprite is then drawn as (atlas.surface, position, atlas.rects[name]),
+    so a whole frame can go to the screen in a single Surface.blits call. If
+    no sprite has partially transparent pixels the atlas becomes an opaque
+    surface with a colorkey, which blits much faster than per-pixel alpha;
+    either way it is RLE accelerated. Needs a display (it converts surfaces).
+
+    With alpha_threshold, pixels at least that opaque become solid and the
+    rest transparent, which always gives the faster colorkey atlas at the
+    cost of hard edges (worth it when thousands of sprites are on screen).
+    """
+    def __init__(self, images, padding=1, alpha_threshold=None):
+        # Shelf packing: tallest images first, rows about as wide as the atlas is tall
+        names = sorted(images, key=lambda name: images[name].get_height(), reverse=True)
+        area = sum(images[name].get_width() * images[name].get_height() for name in names)
+        row_width = max(max(images[name].get_width() for name in names), int(math.sqrt(area) * 1.5))
+        self.rects = {}
+        x = y = row_height = 0
+        for name in names:
+            width, height = images[name].get_size()
+            if x and x + width > row_width:
+                x = 0
+                y += row_height + padding
+                row_height = 0
+            self.rects[name] = pygame.Rect(x, y, width, height)
+            x += width + padding
+            row_height = max(row_height, height)
+        size = (max(rect.right for rect in self.rects.values()), y + row_height)
+
+        # Adding onto transparent black copies each sprite's pixels and alpha exactly
+        sheet = pygame.Surface(size, pygame.SRCALPHA, 32)
+        for name in names:
+            sheet.blit(images[name], self.rects[name], special_flags=pygame.BLEND_RGBA_ADD)
+
+        alpha = pygame.surfarray.pixels_alpha(sheet)
+        if alpha_threshold is not None:
+            alpha[...] = np.where(alpha >= alpha_threshold, 255, 0)
+        partial = np.any((alpha > 0) & (alpha < 255))
+        del alpha
+        key = None if partial else self._unused_color(sheet)
+        if key is None:
+            self.surface = sheet.convert_alpha()
+            self.surface.set_alpha(255, pygame.RLEACCEL)
+        else:
+            self.surface = pygame.Surface(size).convert()
+            self.surface.fill(key)
+            self.surface.blit(sheet, (0, 0))
+            self.surface.set_colorkey(key, pygame.RLEACCEL)
+        self.colorkey = key
+
+    @staticmethod
+    def _unused_color(sheet):
+        """A colorkey that no visible sprite pixel uses, or None"""
+        rgb = pygame.surfarray.pixels3d(sheet)
+        alpha = pygame.surfarray.pixels_alpha(sheet)
+        visible = rgb[alpha > 0].astype(np.uint32)
+        used = set(np.unique((visible[:, 0] << 16) | (visible[:, 1] << 8) | visible[:, 2]).tolist())
+        for r, g, b in _COLORKEYS:
+            if (r << 16) | (g << 8) | b not in used:
+                return (r, g, b)
+        return None
+
+    def blit_args(self, name, position):
+        return (self.surface, position, self.rects[name])
+
+
+class TextCache:
+    """Rendered text surfaces keyed by (font, text, color, antialias), with LRU eviction.
+
+    Most HUD and menu strings are the same every frame, so they are only
+    rasterized again when the text itself changes (for example the score).
+    Call clear() whenever the fonts are recreated.
+    """
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        """Same arguments as font.render, with the font first"""
+        key = (font, text, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+class ResizePipeline:
+    """Coalesces bursts of window resizes and rebuilds surfaces off the main thread.
+
+    request() is called for every resize event. Once no new event has arrived
+    for settle_time seconds, build(size) runs once on a worker thread; poll()
+    hands back (size, result) when it is done so the caller can swap
+    everything in at once. Results for a size the window has already left are
+    dropped. A build that fails on the worker is retried once on the calling
+    thread; if that fails too, the resize is given up and the old surfaces stay.
+    """
+    def __init__(self, build, settle_time=0.25):
+        self.build = build
+        self.settle_time = settle_time
+        self.pending_size = None
+        self.last_request = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.future_size = None
+
+    @property
+    def busy(self):
+        return self.pending_size is not None or self.future is not None
+
+    def request(self, size):
+        self.pending_size = size
+        self.last_request = time.monotonic()
+
+    def poll(self):
+        """(size, build result) once a settled resize has been rebuilt, otherwise None"""
+        if (self.pending_size is not None and self.future is None and
+                time.monotonic() - self.last_request >= self.settle_time):
+            self.future_size = self.pending_size
+            self.pending_size = None
+            self.future = self.executor.submit(self.build, self.future_size)
+        if self.future is None or not self.future.done():
+            return None
+        future = self.future
+        self.future = None
+        if self.pending_size is not None:
+            # The window moved on while building; the next settle rebuilds again
+            return None
+        try:
+            return self.future_size, future.result()
+        except Exception as e:
+            print(f"Failed to rebuild surfaces for {self.future_size} in the background: {e}")
+        try:
+            return self.future_size, self.build(self.future_size)
+        except Exception as e:
+            print(f"Failed to rebuild surfaces for {self.future_size}: {e}")
+            return None
+
+
+class Interpolator:
+    """Blends drawn positions between the last two simulation ticks.
+
+    When the simulation runs at a fixed tick rate and frames are drawn in
+    between ticks, drawing the latest tick makes motion judder. snapshot()
+    keeps the positions from before a tick; positions() then returns them
+    blended towards the current ones by alpha, the fraction of a tick that
+    has passed since. Entities that were replaced or teleported since the
+    snapshot are drawn where they are.
+    """
+    def __init__(self):
+        self.previous = {}
+        self.player_x = None
+
+    def clear(self):
+        self.previous.clear()
+        self.player_x = None
+
+    def snapshot(self, sim):
+        for name, store in (('enemies', sim.enemies), ('bullets', sim.bullets), ('powerups', sim.powerups)):
+            n = store.count
+            self.previous[name] = (store.serial[:n].copy(), store.x[:n].copy(), store.y[:n].copy())
+        self.player_x = sim.player.rect.x
+
+    def positions(self, name, store, indices, alpha, scale=(1.0, 1.0)):
+        """Integer x and y lists to draw the given store slots at, scaled to the drawing surface"""
+        x = store.x[indices]
+        y = store.y[indices]
+        previous = self.previous.get(name)
+        if previous is not None and alpha < 1:
+            serial, previous_x, previous_y = previous
+            known = indices < len(serial)
+            slots = indices[known]
+            # Entities only move vertically; a changed x means an enemy respawned at the top
+            same = (serial[slots] == store.serial[slots]) & (previous_x[slots] == x[known])
+            blended = y[known]
+            blended[same] = previous_y[slots][same] + (blended[same] - previous_y[slots][same]) * alpha
+            y[known] = blended
+        if scale != (1.0, 1.0):
+            x = x * scale[0]
+            y = y * scale[1]
+        return x.astype(int).tolist(), y.astype(int).tolist()
+
+    def player_position(self, player, alpha, scale=(1.0, 1.0)):
+        x = player.rect.x
+        if self.player_x is not None and abs(x - self.player_x) <= player.speed:
+            x = int(self.player_x + (x - self.player_x) * alpha)
+        return int(x * scale[0]), int(player.rect.y * scale[1])
+
+
+class QualityTier:
+    """One step of the quality ladder"""
+    def __init__(self, name, render_scale=1.0, background='full', particles=2048, hard_sprites=False):
+        self.name = name
+        self.render_scale = render_scale  # Internal resolution as a fraction of the window
+        self.background = background  # 'full', 'sparse' or 'plain'
+        self.particles = particles  # Most particles alive at once
+        self.hard_sprites = hard_sprites  # Colorkey atlas instead of alpha-blended sprites
+
+
+class QualityGovernor:
+    """Moves through quality tiers to keep frames within a time budget.
+
+    Tiers go from best (0) to cheapest. frame() takes how long each frame's
+    work took (not the time spent waiting for the frame cap) and decides
+    once per window of frames: when the slowest tenth of the window is over
+    budget it steps down a tier; after `patience` windows in a row well under
+    budget (below headroom * budget) it steps back up. A tier that turned
+    out too slow is not tried again for `cooldown` windows, doubling each
+    time it fails, so the governor settles instead of oscillating.
+    """
+    def __init__(self, tiers, budget, tier=0, window=30, headroom=0.6, patience=4, cooldown=4):
+        self.tiers = tiers
+        self.tier = tier
+        self.budget = budget  # Seconds
+        self.window = window
+        self.headroom = headroom
+        self.patience = patience
+        self.cooldown = cooldown
+        self.times = np.zeros(window)
+        self.count = 0
+        self.calm = 0  # Windows in a row under headroom * budget
+        self.blocked = [0] * len(tiers)  # Windows before each tier may be tried again
+        self.penalty = [cooldown] * len(tiers)
+        self.changes = 0
+
+    @property
+    def current(self):
+        return self.tiers[self.tier]
+
+    def reset(self):
+        """Drop the frames of the current window, after a pause or a rebuild"""
+        self.count = 0
+
+    def frame(self, seconds):
+        """Add one frame's work time; True when the tier changed"""
+        self.times[self.count] = seconds
+        self.count += 1
+        if self.count < self.window:
+            return False
+        self.count = 0
+        slow = np.percentile(self.times, 90)
+        self.blocked = [max(windows - 1, 0) for windows in self.blocked]
+        if slow > self.budget:
+            self.calm = 0
+            if self.tier == len(self.tiers) - 1:
+                return False
+            self.blocked[self.tier] = self.penalty[self.tier]
+            self.penalty[self.tier] *= 2
+            self.tier += 1
+        elif slow < self.budget * self.headroom:
+            self.calm += 1
+            if self.calm < self.patience:
+                return False
+            # Settled here, so this tier starts over with the shortest cooldown
+            self.penalty[self.tier] = self.cooldown
+            if self.tier == 0 or self.blocked[self.tier - 1]:
+                return False
+            self.calm = 0
+            self.tier -= 1
+        else:
+            self.calm = 0
+            return False
+        self.changes += 1
+        return True
@@ -0,0 +1,197 @@
+"""Recording and headless replay of games.
+
+A game is fully determined by its seed, its rules (GameConfig), any window
+resizes, the sprite masks it collided with and the per-tick action flags.
+A recording stores exactly that, plus the final score and state so a replay
+can check it reproduced the game. Action flags repeat for long stretches, so
+they are run-length encoded: a ten-minute game is usually a few kilobytes.
+
+Replaying needs no display and runs as fast as the simulation can step:
+
+    python replay.py recordings/game-20260101-120000.replay --profile frames.json
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from collision import SpriteMasks
+from profiler import FrameProfiler
+from simulation import GameConfig, Simulation, GAME
+from waves import WaveScript
+
+_MAGIC = b'AIRP'
+_VERSION = 1
+# magic, version, game seed, ticks, final score, final state, metadata length
+_HEADER = struct.Struct('<4sBQIiBI')
+_RUN = np.dtype([('actions', 'u1'), ('length', '<u2')])
+
+
+def encode_actions(actions):
+    """Run-length encode a uint8 array of per-tick action flags"""
+    actions = np.asarray(actions, dtype=np.uint8)
+    if len(actions) == 0:
+        return b''
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(actions)) + 1))
+    lengths = np.diff(np.concatenate((starts, [len(actions)])))
+    values = actions[starts]
+    # Runs longer than a uint16 are split
+    pieces = -(-lengths // 0xFFFF)
+    runs = np.zeros(int(pieces.sum()), dtype=_RUN)
+    runs['actions'] = np.repeat(values, pieces)
+    run_lengths = np.full(len(runs), 0xFFFF, dtype=np.int64)
+    last = np.cumsum(pieces) - 1
+    run_lengths[last] = lengths - (pieces - 1) * 0xFFFF
+    runs['length'] = run_lengths
+    return runs.tobytes()
+
+
+def decode_actions(data):
+    runs = np.frombuffer(data, dtype=_RUN)
+    return np.repeat(runs['actions'], runs['length'].astype(np.int64))
+
+
+class Recording:
+    """Seed, rules, resizes and inputs of one game, with its final result"""
+    def __init__(self, seed, config, actions=None, resizes=None, score=0, state=GAME, waves=None, masks=None):
+        self.seed = seed
+        self.config = config  # GameConfig.to_dict() at the start of the game
+        self.waves = waves  # Wave script path of a swarm mode game
+        self.actions = actions if actions is not None else bytearray()
+        self.resizes = resizes if resizes is not None else []  # [tick, width, height]
+        self.masks = masks if masks is not None else []  # [tick, SpriteMasks.to_dict()]
+        self.score = score
+        self.state = state
+
+    @property
+    def ticks(self):
+        return len(self.actions)
+
+    def save(self, path):
+        metadata = {'config': self.config, 'resizes': self.resizes}
+        if self.waves is not None:
+            metadata['waves'] = self.waves
+        if self.masks:
+            metadata['masks'] = self.masks
+        metadata = json.dumps(metadata).encode()
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, self.seed, self.ticks, self.score, self.state, len(metadata)))
+            f.write(metadata)
+            f.write(encode_actions(np.frombuffer(bytes(self.actions), dtype=np.uint8)))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, seed, ticks, score, state, metadata_length = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} replay")
+        start = _HEADER.size
+        metadata = json.loads(data[start:start + metadata_length])
+        actions = decode_actions(data[start + metadata_length:])
+        if len(actions) != ticks:
+            raise ValueError(f"{path} is truncated: {len(actions)} of {ticks} ticks")
+        return cls(seed, metadata['config'], actions, metadata['resizes'], score, state, metadata.get('waves'),
+                   metadata.get('masks'))
+
+
+class InputRecorder:
+    """Captures the game being played by a Simulation"""
+    def __init__(self):
+        self.recording = None
+
+    def start(self, sim):
+        """Call right after sim.reset()"""
+        self.recording = Recording(sim.game_seed, sim.config.to_dict(),
+                                   waves=sim.waves.path if sim.waves is not None else None)
+        if sim.masks is not None:
+            self.masks(sim.masks)
+
+    def record(self, actions):
+        if self.recording is not None:
+            self.recording.actions.append(actions)
+
+    def resize(self, width, height):
+        if self.recording is not None:
+            self.recording.resizes.append([self.recording.ticks, width, height])
+
+    def masks(self, masks):
+        """The simulation collides with these SpriteMasks from the next tick on"""
+        if self.recording is not None:
+            self.recording.masks.append([self.recording.ticks, masks.to_dict()])
+
+    def truncate(self, ticks):
+        """Forget everything from tick `ticks` on, after the game was rewound to it"""
+        if self.recording is not None:
+            del self.recording.actions[ticks:]
+            self.recording.resizes = [resize for resize in self.recording.resizes if resize[0] <= ticks]
+            self.recording.masks = [masks for masks in self.recording.masks if masks[0] <= ticks]
+
+    def discard(self):
+        """Stop recording without saving, for games that cannot be replayed from their seed"""
+        self.recording = None
+
+    def finish(self, sim, path):
+        """Store the final result and write the recording"""
+        recording = self.recording
+        self.recording = None
+        recording.score = sim.score
+        recording.state = sim.state
+        recording.save(path)
+        return recording
+
+
+def replay(recording, profiler=None):
+    """Re-run a recording without a display; returns the finished Simulation"""
+    waves = WaveScript(recording.waves) if recording.waves is not None else None
+    sim = Simulation(GameConfig.from_dict(recording.config), profiler=profiler, waves=waves)
+    sim.reset(recording.seed)
+    resizes = iter(recording.resizes)
+    next_resize = next(resizes, None)
+    masks = iter(recording.masks)
+    next_masks = next(masks, None)
+    for tick, actions in enumerate(recording.actions):
+        while next_resize is not None and next_resize[0] == tick:
+            sim.resize(next_resize[1], next_resize[2])
+            next_resize = next(resizes, None)
+        while next_masks is not None and next_masks[0] == tick:
+            sim.masks = SpriteMasks.from_dict(next_masks[1])
+            next_masks = next(masks, None)
+        sim.step(int(actions))
+        if sim.profiler.enabled:
+            sim.profiler.end_frame()
+    return sim
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded Alien Invasion games headlessly")
+    parser.add_argument('recordings', nargs='+', help=".replay files to check")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="write per-tick timings of the (last) replay to PATH (.json or .csv)")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for path in args.recordings:
+        recording = Recording.load(path)
+        profiler = FrameProfiler(enabled=args.profile is not None)
+        start = time.perf_counter()
+        sim = replay(recording, profiler)
+        elapsed = time.perf_counter() - start
+        matches = sim.score == recording.score and sim.state == recording.state
+        failures += not matches
+        print(f"{path}: {recording.ticks} ticks in {elapsed:.3f}s "
+              f"({recording.ticks / max(elapsed, 1e-9):,.0f} ticks/s), score {sim.score} "
+              f"(recorded {recording.score}), {'OK' if matches else 'MISMATCH'}")
+        if args.profile:
+            profiler.export(args.profile)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Persistent leaderboard with write-behind saving.
+
+ScoreStore keeps the best runs (score plus per-run stats) in memory and
+saves them from a background thread, so recording a result never blocks
+the frame loop. Results that arrive close together are written once.
+Every save goes to a temporary file that is fsynced and then renamed over
+the previous one, which is kept as a .bak; a power cut therefore leaves
+either the old or the new leaderboard on disk, never a torn one. An
+unreadable file is reported and the backup used instead.
+
+    python scores.py            # print the leaderboard
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+from simulation import GAME_OVER, VICTORY
+
+_VERSION = 1
+
+
+class ScoreStore:
+    """Leaderboard of the best max_entries runs, saved to path in the background"""
+    def __init__(self, path='high_scores.json', max_entries=100, legacy_path='high_score.txt', write_delay=0.5):
+        self.path = path
+        self.max_entries = max_entries
+        self.legacy_path = legacy_path
+        self.write_delay = write_delay  # Seconds to wait for more results before saving
+        self.entries = self.load()
+        self._cond = threading.Condition()
+        self._version = 0  # Changes made
+        self._written = 0  # Changes saved (or given up on)
+        self._flushing = False
+        self._closed = False
+        self._thread = None
+
+    @property
+    def high_score(self):
+        return self.entries[0]['score'] if self.entries else 0
+
+    def load(self):
+        """Entries from the score file, its backup, or the old single high score"""
+        for path in (self.path, self.path + '.bak'):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                return self._sorted([dict(entry) for entry in data['entries'] if 'score' in entry])
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Ignoring unreadable score file {path}: {e}")
+        try:
+            with open(self.legacy_path) as f:
+                return [{'score': int(f.read()), 'result': 'imported'}]
+        except (OSError, ValueError):
+            return []
+
+    def _sorted(self, entries):
+        # Best score first; equal scores keep the earlier run first
+        entries.sort(key=lambda entry: (-entry['score'], entry.get('time', 0)))
+        return entries[:self.max_entries]
+
+    def add(self, entry):
+        """Record a finished run (a dict with at least 'score'); returns its rank or None"""
+        entry = dict(entry)
+        entry.setdefault('time', time.time())
+        with self._cond:
+            self.entries = self._sorted(self.entries + [entry])
+            rank = next((i + 1 for i, e in enumerate(self.entries) if e is entry), None)
+            if rank is not None:
+                self._version += 1
+                self._start_writer()
+                self._cond.notify_all()
+        return rank
+
+    def flush(self, timeout=None):
+        """Save pending changes now and wait for them; False on timeout"""
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: self._written == self._version, timeout)
+            self._flushing = False
+            return done
+
+    def close(self, timeout=5):
+        """Save pending changes and stop the writer thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _start_writer(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name='score-writer', daemon=True)
+            self._thread.start()
+            # Results still waiting to be written are saved on any normal exit
+            atexit.register(self.close)
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._written != self._version or self._closed)
+                if self._written == self._version:
+                    return
+                # Let a burst of results pile up into one write
+                self._cond.wait_for(lambda: self._flushing or self._closed, self.write_delay)
+                entries = list(self.entries)
+                version = self._version
+            try:
+                self._write(entries)
+            except OSError as e:
+                # Entries stay in memory; the next result retries the save
+                print(f"Failed to save scores: {e}")
+            with self._cond:
+                self._written = version
+                self._cond.notify_all()
+
+    def _write(self, entries):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'version': _VERSION, 'entries': entries}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        # A crash between these renames leaves the backup, which load() falls back to
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + '.bak')
+        os.replace(temp_path, self.path)
+        # Make the renames themselves durable (not possible on Windows)
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+def run_entry(sim):
+    """Leaderboard entry for a finished Simulation"""
+    results = {GAME_OVER: 'game_over', VICTORY: 'victory'}
+    return {
+        'score': sim.score,
+        'result': results.get(sim.state, 'unfinished'),
+        'ticks': sim.tick_count,
+        'seconds': round(sim.tick_count / sim.config.tick_rate, 2),
+        'lives': sim.lives,
+        'max_lives': sim.config.max_lives,
+        'target_score': sim.config.target_score,
+        'seed': sim.game_seed,
+    }
+
+
+if __name__ == "__main__":
+    store = ScoreStore(*sys.argv[1:2])
+    for rank, entry in enumerate(store.entries, 1):
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['time'])) if 'time' in entry else '-'
+        seconds = f"{entry['seconds']:.1f}s" if 'seconds' in entry else '-'
+        print(f"{rank:3}. {entry['score']:6}  {entry.get('result', '-'):<10} {seconds:>8}  {when}")
@@ -0,0 +1,486 @@
+"""Headless game rules for Alien Invasion.
+
+The simulation owns everything that decides the outcome of a game: player
+movement, enemies, bullets, powerups, scoring and win/lose. It never touches
+the display or the keyboard, so it runs without a window (and without an SDL
+video driver) and steps as fast as the CPU allows. Input arrives as a plain
+integer of action flags per tick.
+"""
+import numpy as np
+import pygame
+
+from collision import SpatialGrid, resolve_group_hits
+from entities import EntityStore
+from profiler import NULL_PROFILER
+
+# Game states
+MENU = 0
+GAME = 1
+GAME_OVER = 2
+VICTORY = 3
+
+# Per-tick action flags
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_FIRE = 4
+
+
+class GameConfig:
+    """Tunable rules and playfield size for one simulation"""
+    def __init__(self, width=800, height=600, target_score=250, max_lives=3,
+                 enemy_speeds=None, powerup_chance=0.01, normal_cooldown=20,
+                 rapid_fire_cooldown=5, powerup_duration=300,
+                 enemy_capacity=64, bullet_capacity=256, powerup_capacity=16, tick_rate=60):
+        self.width = width
+        self.height = height
+        self.target_score = target_score  # Player wins when reaching this score
+        self.max_lives = max_lives
+        # Base speed per point value (higher points = faster enemies)
+        self.enemy_speeds = enemy_speeds or {10: 2, 30: 3, 50: 4}
+        # Rates and durations below are per frame of the original 60 FPS game;
+        # they are converted when the simulation runs at another tick_rate
+        self.powerup_chance = powerup_chance  # Chance per frame to drop a powerup
+        self.normal_cooldown = normal_cooldown
+        self.rapid_fire_cooldown = rapid_fire_cooldown
+        self.powerup_duration = powerup_duration  # 5 seconds
+        # Preallocated pool sizes; pools grow (and count it) if these run out
+        self.enemy_capacity = enemy_capacity
+        self.bullet_capacity = bullet_capacity
+        self.powerup_capacity = powerup_capacity
+        self.tick_rate = tick_rate  # Simulation ticks per second
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, values):
+        values = dict(values)
+        # JSON turns the point values into strings
+        values['enemy_speeds'] = {int(points): speed for points, speed in values['enemy_speeds'].items()}
+        return cls(**values)
+
+    @property
+    def scale_x(self):
+        # Scale factor based on reference resolution of 800x600
+        return self.width / 800
+
+    @property
+    def scale_y(self):
+        return self.height / 600
+
+    def scale_value(self, value, is_horizontal=True):
+        return int(value * (self.scale_x if is_horizontal else self.scale_y))
+
+    def sprite_size(self, width, height):
+        return (self.scale_value(width), self.scale_value(height, False))
+
+    def speed(self, value, is_horizontal=True):
+        """Pixels per tick for a speed given in (reference) pixels per 60 FPS frame"""
+        speed = self.scale_value(value, is_horizontal)
+        return speed if self.tick_rate == 60 else speed * 60 / self.tick_rate
+
+    def ticks(self, frames):
+        """Ticks lasting as long as a number of 60 FPS frames"""
+        return frames if self.tick_rate == 60 else max(1, round(frames * self.tick_rate / 60))
+
+    def chance(self, per_frame):
+        """Per-tick probability with the same expected rate as a per-frame one"""
+        return per_frame if self.tick_rate == 60 else 1 - (1 - per_frame) ** (60 / self.tick_rate)
+
+
+class Player(pygame.sprite.Sprite):
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.rect = pygame.Rect((0, 0), config.sprite_size(50, 50))
+        self.normal_speed = config.speed(5)  # Scale speed based on screen width
+        self.reset()
+
+    def update(self, actions):
+        # Movement; x keeps the fractional part that the rect cannot hold
+        if actions & ACTION_LEFT and self.rect.left > 0:
+            self.x -= self.speed
+            self.rect.x = int(self.x)
+        if actions & ACTION_RIGHT and self.rect.right < self.config.width:
+            self.x += self.speed
+            self.rect.x = int(self.x)
+
+        # Cooldown for shooting
+        if self.cooldown > 0:
+            self.cooldown -= 1
+
+        # Handle power-up timers
+        if self.rapid_fire_timer > 0:
+            self.rapid_fire_timer -= 1
+            if self.rapid_fire_timer == 0:
+                self.cooldown = self.config.ticks(self.config.normal_cooldown)
+
+        if self.speed_boost_timer > 0:
+            self.speed_boost_timer -= 1
+            if self.speed_boost_timer == 0:
+                self.speed = self.normal_speed
+
+    def shoot(self, bullets):
+        if self.cooldown == 0:
+            width, height = self.config.sprite_size(10, 20)
+            # Scale speed based on screen height
+            bullets.add(self.rect.centerx - width // 2, self.rect.top - height,
+                        width, height, -self.config.speed(10, False))
+            if self.rapid_fire_timer > 0:
+                self.cooldown = self.config.ticks(self.config.rapid_fire_cooldown)
+            else:
+                self.cooldown = self.config.ticks(self.config.normal_cooldown)
+
+    def resize(self):
+        """Pick up a new playfield size from the config"""
+        self.rect.size = self.config.sprite_size(50, 50)
+        self.normal_speed = self.config.speed(5)
+        self.speed = self.normal_speed * 2 if self.speed_boost_timer > 0 else self.normal_speed
+        self.place_at_start()
+
+    def place_at_start(self):
+        self.rect.centerx = self.config.width // 2
+        self.rect.bottom = self.config.height - self.config.scale_value(10, False)
+        self.x = float(self.rect.x)
+
+    def reset(self):
+        self.place_at_start()
+        self.speed = self.normal_speed
+        self.cooldown = 0
+        self.rapid_fire_timer = 0
+        self.speed_boost_timer = 0
+
+    def rapid_fire(self):
+        self.rapid_fire_timer = self.config.ticks(self.config.powerup_duration)
+        self.cooldown = self.config.ticks(self.config.rapid_fire_cooldown)
+
+    def speed_boost(self):
+        self.speed_boost_timer = self.config.ticks(self.config.powerup_duration)
+        self.speed = self.normal_speed * 2
+
+
+# Powerup kinds, stored as indices into this tuple
+POWERUP_TYPES = ("speed", "rapid_fire", "heart")
+
+
+def store_rects(store, indices):
+    """x, y, width and height arrays of the given store entities"""
+    return store.x[indices], store.y[indices], store.w[indices], store.h[indices]
+
+
+def rect_overlaps(store, indices, rect):
+    """Mask of the given store entities whose rects overlap rect (like Rect.colliderect)"""
+    x = store.x[indices]
+    y = store.y[indices]
+    return ((x < rect.right) & (rect.x < x + store.w[indices]) &
+            (y < rect.bottom) & (rect.y < y + store.h[indices]))
+
+
+class Simulation:
+    """Fixed-timestep game rules driven by per-tick action flags"""
+    def __init__(self, config=None, seed=None, profiler=None, waves=None, masks=None):
+        self.config = config or GameConfig()
+        self.profiler = profiler or NULL_PROFILER
+        # Sprite masks (collision.SpriteMasks) make hits pixel-accurate;
+        # without them, as when running headless, rects are solid
+        self.masks = masks
+        # Swarm mode: enemies come from a wave script (waves.WaveScript)
+        # instead of the endless 5/3/2 wave, and the game is won by surviving it
+        self.waves = waves
+        self.wave_cursor = 0
+        # Every game gets its own seed, drawn from this session stream
+        self.session_rng = np.random.default_rng(seed)
+        self.game_seed = None
+        self.enemy_rng = self.powerup_rng = None
+        self.player = Player(self.config)
+        self.enemies = EntityStore(self.config.enemy_capacity)
+        self.bullets = EntityStore(self.config.bullet_capacity)
+        self.powerups = EntityStore(self.config.powerup_capacity)
+        # Cells at least as large as the biggest sprite keep lookups to a few cells
+        self.grid = SpatialGrid(max(self.config.sprite_size(50, 50)))
+        self.state = MENU
+        self.score = 0
+        self.lives = self.config.max_lives
+        self.tick_count = 0
+        # What was hit during the last tick, for visual effects: (kind, x, y, value)
+        # with arrays of entity centers, value being enemy points or powerup kind
+        self.events = []
+
+    @property
+    def max_lives(self):
+        return self.config.max_lives
+
+    @property
+    def target_score(self):
+        return self.config.target_score
+
+    def reset(self, seed=None):
+        """Start a new game; the same seed and inputs always play out the same way"""
+        if seed is None:
+            seed = int(self.session_rng.integers(2 ** 63))
+        self.game_seed = seed
+        # Separate streams, so changing how often powerups drop does not
+        # move the enemies (and the other way round)
+        enemy_seed, powerup_seed = np.random.SeedSequence(seed).spawn(2)
+        self.enemy_rng = np.random.default_rng(enemy_seed)
+        self.powerup_rng = np.random.default_rng(powerup_seed)
+        self.state = GAME
+        self.score = 0
+        self.lives = self.config.max_lives
+        self.tick_count = 0
+        self.events.clear()
+        self.player.reset()
+        self.bullets.clear()
+        self.powerups.clear()
+        if self.waves is None:
+            self.spawn_enemies()
+        else:
+            self.enemies.clear()
+            self.wave_cursor = 0
+
+    def resize(self, width, height):
+        """Change the playfield size, rescaling every entity; the player is moved back to the start"""
+        scale_x = width / self.config.width
+        scale_y = height / self.config.height
+        self.config.width = width
+        self.config.height = height
+        config = self.config
+
+        # Positions scale with the playfield; sizes and speeds are recomputed
+        # exactly as they would be for entities spawned at the new size
+        for store, size in ((self.enemies, (40, 40)), (self.bullets, (10, 20)), (self.powerups, (30, 30))):
+            n = store.count
+            store.x[:n] *= scale_x
+            store.y[:n] *= scale_y
+            store.w[:n], store.h[:n] = config.sprite_size(*size)
+        # Released slots keep standing still
+        alive = self.enemies.alive[:self.enemies.count]
+        for points, base_speed in config.enemy_speeds.items():
+            matching = alive & (self.enemies.points[:self.enemies.count] == points)
+            self.enemies.speed[:self.enemies.count][matching] = config.speed(base_speed, False)
+        alive = self.bullets.alive[:self.bullets.count]
+        self.bullets.speed[:self.bullets.count][alive] = -config.speed(10, False)
+        alive = self.powerups.alive[:self.powerups.count]
+        self.powerups.speed[:self.powerups.count][alive] = config.speed(3, False)
+        self.grid.cell_size = max(config.sprite_size(50, 50))
+
+        self.player.resize()
+
+    def enemy_start_positions(self, count, width):
+        """Random positions just above the top of the screen"""
+        x = self.enemy_rng.integers(0, self.config.width - width, count, endpoint=True)
+        y = self.enemy_rng.integers(-self.config.scale_value(100, False),
+                              -self.config.scale_value(40, False), count, endpoint=True)
+        return x, y
+
+    def add_enemies(self, count, points):
+        width, height = self.config.sprite_size(40, 40)
+        x, y = self.enemy_start_positions(count, width)
+        # Scale speed based on screen height
+        speed = self.config.speed(self.config.enemy_speeds[points], False)
+        self.enemies.add_many(x, y, width, height, speed, points)
+
+    def spawn_enemies(self):
+        # Clear existing enemies
+        self.enemies.clear()
+
+        # Spawn enemies with different point values
+        self.add_enemies(5, 10)
+        self.add_enemies(3, 30)
+        self.add_enemies(2, 50)
+
+    def spawn_scheduled(self):
+        """Release the wave script's enemies that are due by the current tick"""
+        config = self.config
+        start, stop = self.waves.due(self.wave_cursor, self.tick_count * 1000 // config.tick_rate)
+        if stop == start:
+            return
+        events = self.waves.events[start:stop]
+        self.wave_cursor = stop
+        width, height = config.sprite_size(40, 40)
+        for points in np.unique(events['points']).tolist():
+            chosen = events[events['points'] == points]
+            self.enemies.add_many(np.minimum(chosen['x'] * config.scale_x, config.width - width),
+                                  chosen['y'] * config.scale_y, width, height,
+                                  config.speed(config.enemy_speeds[points], False), points)
+
+    def spawn_powerup(self):
+        rng = self.powerup_rng
+        if rng.random() < self.config.chance(self.config.powerup_chance):
+            kind = rng.integers(len(POWERUP_TYPES))
+            width, height = self.config.sprite_size(30, 30)
+            x = rng.integers(0, self.config.width - width, endpoint=True)
+            # Scale speed based on screen height
+            self.powerups.add(x, -height, width, height,
+                              self.config.speed(3, False), kind=kind)
+
+    def move_entities(self):
+        # Bullets are removed once they leave the top of the screen
+        self.bullets.move()
+        self.bullets.kill(self.bullets.above(0))
+
+        # Enemies that leave the bottom of the screen come back at the top,
+        # except in swarm mode where the script keeps sending new ones
+        self.enemies.move()
+        if self.waves is not None:
+            self.enemies.kill(self.enemies.below(self.config.height))
+            respawn = []
+        else:
+            respawn = np.flatnonzero(self.enemies.below(self.config.height))
+        if len(respawn):
+            x, y = self.enemy_start_positions(len(respawn), self.enemies.w[respawn])
+            self.enemies.x[respawn] = x
+            self.enemies.y[respawn] = y
+
+        # Powerups are removed once they leave the bottom of the screen
+        self.powerups.move()
+        self.powerups.kill(self.powerups.below(self.config.height))
+
+    def collide_bullets(self):
+        """Remove bullets and the enemies they hit, same results as groupcollide"""
+        enemies = self.enemies.active()
+        self.grid.build(self.enemies, enemies)
+        # groupcollide handles bullets in the order they were fired
+        bullets = self.bullets.in_order(self.bullets.active())
+        query, found = self.grid.query_store(self.bullets, bullets)
+        # Of the pairs whose rects overlap, only those whose pixels touch count
+        if self.masks is not None and len(query):
+            touching = self.masks.overlaps('bullet', *store_rects(self.bullets, bullets[query]),
+                                           self.mask_names(self.enemies, enemies[found]),
+                                           *store_rects(self.enemies, enemies[found]))
+            query = query[touching]
+            found = found[touching]
+        killers, dead = resolve_group_hits(query, found, len(enemies))
+        self.bullets.kill(bullets[killers])
+        killed = enemies[dead]
+        if len(killed):
+            self.score += int(self.enemies.points[killed].sum())
+            self.add_event('enemy_killed', self.enemies, killed)
+        self.enemies.kill(killed)
+
+    def mask_names(self, store, indices):
+        """Sprite names of entities, to look up their masks"""
+        if store is self.enemies:
+            return [f'enemy_{points}' for points in store.points[indices].tolist()]
+        return [POWERUP_TYPES[kind] for kind in store.kind[indices].tolist()]
+
+    def touching_player(self, store, indices):
+        """The entities among indices, whose rects overlap the player's, that touch its pixels"""
+        if self.masks is None or len(indices) == 0:
+            return indices
+        rect = self.player.rect
+        touching = self.masks.overlaps('player', rect.x, rect.y, rect.width, rect.height,
+                                       self.mask_names(store, indices), *store_rects(store, indices))
+        return indices[touching]
+
+    def add_event(self, kind, store, indices):
+        # Powerups are told apart by kind, enemies by points
+        value = store.kind[indices] if kind == 'powerup_collected' else store.points[indices]
+        self.events.append((kind, store.x[indices] + store.w[indices] / 2,
+                            store.y[indices] + store.h[indices] / 2, value))
+
+    def step(self, actions=0):
+        """Advance the game by one tick"""
+        if self.state != GAME:
+            return
+        self.tick_count += 1
+        self.events.clear()
+
+        profiler = self.profiler
+
+        with profiler.phase('movement'):
+            if actions & ACTION_FIRE:
+                self.player.shoot(self.bullets)
+
+            # Update player
+            self.player.update(actions)
+
+            # Update bullets, enemies and powerups
+            self.move_entities()
+
+        with profiler.phase('spawning'):
+            if self.waves is not None:
+                self.spawn_scheduled()
+            self.spawn_powerup()
+
+        with profiler.phase('collisions'):
+            # Check for bullet-enemy collisions
+            self.collide_bullets()
+
+            # Check for player-enemy collisions, reusing the grid from the bullet pass
+            crashed = self.grid.indices[self.grid.query_rect(self.player.rect)]
+            crashed = self.touching_player(self.enemies, crashed[self.enemies.alive[crashed]])
+            if len(crashed):
+                self.add_event('player_hit', self.enemies, crashed)
+                self.enemies.kill(crashed)
+                self.lives -= 1
+                if self.lives <= 0:
+                    self.state = GAME_OVER
+
+            # Check for player-powerup collisions
+            powerups = self.powerups.active()
+            collected = self.touching_player(self.powerups,
+                                             powerups[rect_overlaps(self.powerups, powerups, self.player.rect)])
+            if len(collected):
+                self.add_event('powerup_collected', self.powerups, collected)
+            for i in collected:
+                powerup_type = POWERUP_TYPES[self.powerups.kind[i]]
+                if powerup_type == "speed":
+                    self.player.speed_boost()
+                elif powerup_type == "rapid_fire":
+                    self.player.rapid_fire()
+                elif powerup_type == "heart" and self.lives < self.config.max_lives:
+                    self.lives += 1
+            self.powerups.kill(collected)
+
+        if self.waves is not None:
+            # Swarm mode is won once the whole script has been released and survived
+            if self.state == GAME and self.wave_cursor == len(self.waves) and len(self.enemies) == 0:
+                self.state = VICTORY
+            return
+
+        # Check if player reached target score
+        if self.score >= self.config.target_score:
+            self.state = VICTORY
+
+        # Spawn new enemies if all are defeated
+        if len(self.enemies) == 0:
+            with profiler.phase('spawning'):
+                self.spawn_enemies()
+
+    def pool_stats(self):
+        return {
+            'enemies': self.enemies.stats(),
+            'bullets': self.bullets.stats(),
+            'powerups': self.powerups.stats(),
+        }
+
+    def run(self, policy, max_ticks=100000, seed=None):
+        """Play one game with policy(simulation) -> actions; returns the final state"""
+        self.reset(seed)
+        while self.state == GAME and self.tick_count < max_ticks:
+            self.step(policy(self))
+        return self.state
+
+
+def check_parked_slots_after_resize(seed=0):
+    """Released slots keep still through a resize and the movement after it"""
+    sim = Simulation(GameConfig(), seed=seed)
+    sim.reset(seed)
+    for _ in range(3):
+        sim.step(ACTION_FIRE)
+        sim.step()
+    parked = [(store, store.active()[0]) for store in (sim.enemies, sim.bullets)]
+    for store, slot in parked:
+        store.release([slot])
+    sim.resize(1024, 768)
+    before = [store.y[slot] for store, slot in parked]
+    # A tick's movement, without the spawning that could hand the slots out again
+    sim.move_entities()
+    return all(store.speed[slot] == 0 and store.y[slot] == y and not store.alive[slot]
+               for (store, slot), y in zip(parked, before))
+
+
+if __name__ == "__main__":
+    print("released slots stay put across a resize" if check_parked_slots_after_resize()
+          else "a resize set released slots moving again")
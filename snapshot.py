@@ -0,0 +1,181 @@
+"""Compact binary snapshots of a running Simulation, for sending over a network.
+
+A Snapshot holds what a viewer needs to draw one tick: score, lives, game
+state, the player, and for every enemy, bullet and powerup its serial
+number, whole-pixel position and point value (or powerup kind). Entities
+sit in structured NumPy arrays sorted by serial, so capturing, comparing and
+encoding a tick are array operations whatever the number of entities.
+
+encode() writes a snapshot either in full or as a delta against an older
+snapshot the receiver already has:
+- entities of the base snapshot that are gone: one bit each
+- entities still there: their position change, as int8 when everything
+  moved by less than 128 pixels (the usual case), else int16
+- new entities: full records
+Columns are stored one after the other and compressed with zlib.
+Everything moves at a fixed speed, so the columns are very repetitive and
+a tick of a full screen compresses to a few hundred bytes. Only the small
+fixed header stays uncompressed, so peek() can tell which base a snapshot
+needs before decoding it.
+
+    frame = encode(capture(sim, frame_id), base=acked_snapshot)
+    snapshot = decode(frame, base=acked_snapshot)
+    apply(snapshot, viewer_sim)    # mirror it into a Simulation for drawing
+"""
+import struct
+import zlib
+
+import numpy as np
+
+# Entity stores in snapshot order, with the reference sprite sizes the simulation uses
+STORES = (('enemies', (40, 40)), ('bullets', (10, 20)), ('powerups', (30, 30)))
+ENTITY = np.dtype([('serial', '<u4'), ('x', '<i2'), ('y', '<i2'), ('value', 'u1')])
+
+# frame, base frame (NO_BASE for a full snapshot), score, lives, state,
+# playfield width and height, player x and y, rapid fire and speed boost ticks left
+_HEADER = struct.Struct('<IIiHBHHhhHH')
+NO_BASE = 0xFFFFFFFF
+# Per store: kept count, new count, delta width (0: no deltas, 1: int8, 2: int16)
+_STORE = struct.Struct('<IIB')
+
+
+class Snapshot:
+    """One tick of game state as seen by a viewer"""
+    def __init__(self, frame, score, lives, state, size, player, entities):
+        self.frame = frame  # Server frame number; keeps counting across games
+        self.score = score
+        self.lives = lives
+        self.state = state
+        self.size = size  # Playfield (width, height) the positions refer to
+        self.player = player  # (x, y, rapid fire ticks left, speed boost ticks left)
+        self.entities = entities  # Store name -> ENTITY array sorted by serial
+
+    def __eq__(self, other):
+        return (isinstance(other, Snapshot) and self._header() == other._header()
+                and all(np.array_equal(self.entities[name], other.entities[name]) for name, _ in STORES))
+
+    def _header(self, base_frame=NO_BASE):
+        return (self.frame, base_frame, self.score, self.lives, self.state, *self.size, *self.player)
+
+
+def capture(sim, frame):
+    """Snapshot of a Simulation's current tick"""
+    entities = {}
+    for name, _ in STORES:
+        store = getattr(sim, name)
+        active = store.active()
+        active = active[np.argsort(store.serial[active], kind='stable')]
+        records = np.empty(len(active), dtype=ENTITY)
+        records['serial'] = store.serial[active]
+        records['x'] = np.floor(store.x[active])
+        records['y'] = np.floor(store.y[active])
+        records['value'] = store.kind[active] if name == 'powerups' else store.points[active]
+        entities[name] = records
+    player = sim.player
+    return Snapshot(frame, sim.score, max(sim.lives, 0), sim.state, (sim.config.width, sim.config.height),
+                    (player.rect.x, player.rect.y, player.rapid_fire_timer, player.speed_boost_timer), entities)
+
+
+def encode(snapshot, base=None):
+    """Bytes for snapshot, as a delta against base when given"""
+    header = _HEADER.pack(*snapshot._header(base.frame if base is not None else NO_BASE))
+    parts = []
+    for name, _ in STORES:
+        records = snapshot.entities[name]
+        if base is None:
+            parts.append(_STORE.pack(0, len(records), 0))
+            new = records
+        else:
+            previous = base.entities[name]
+            # Both sides are sorted by serial, so a binary search pairs them up
+            where = np.minimum(np.searchsorted(previous['serial'], records['serial']), max(len(previous) - 1, 0))
+            matched = (previous['serial'][where] == records['serial']) if len(previous) else np.zeros(len(records), bool)
+            kept = np.zeros(len(previous), dtype=bool)
+            kept[where[matched]] = True
+            old = previous[where[matched]]
+            now = records[matched]
+            new = records[~matched]
+            deltas = [now[field].astype(np.int32) - old[field] for field in ('x', 'y', 'value')]
+            largest = max((int(np.abs(delta).max()) for delta in deltas if len(delta)), default=0)
+            width = 0 if largest == 0 else 1 if largest < 128 else 2
+            parts.append(_STORE.pack(len(old), len(new), width))
+            parts.append(np.packbits(kept).tobytes())
+            if width:
+                dtype = np.int8 if width == 1 else np.int16
+                parts.extend(delta.astype(dtype).tobytes() for delta in deltas)
+        # Column by column compresses far better than record by record
+        parts.extend(new[field].tobytes() for field in ENTITY.names)
+    return header + zlib.compress(b''.join(parts), 1)
+
+
+def peek(data):
+    """(frame, base frame) of encoded bytes; base frame is NO_BASE for a full snapshot"""
+    return struct.unpack_from('<II', data)
+
+
+def decode(data, base=None):
+    """Snapshot from encode() output; base must be the snapshot it was encoded against"""
+    frame, base_frame, score, lives, state, width, height, *player = _HEADER.unpack_from(data)
+    if base_frame != NO_BASE and (base is None or base.frame != base_frame):
+        raise ValueError(f"Snapshot {frame} needs base {base_frame}")
+    data = zlib.decompress(memoryview(data)[_HEADER.size:])
+    offset = 0
+
+    def take(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array
+
+    entities = {}
+    for name, _ in STORES:
+        kept_count, new_count, width_code = _STORE.unpack_from(data, offset)
+        offset += _STORE.size
+        records = np.empty(kept_count + new_count, dtype=ENTITY)
+        if base_frame != NO_BASE:
+            previous = base.entities[name]
+            kept = np.unpackbits(take(np.uint8, (len(previous) + 7) // 8), count=len(previous)).astype(bool)
+            old = previous[kept]
+            records[:kept_count] = old
+            if width_code:
+                dtype = np.int8 if width_code == 1 else np.int16
+                for field in ('x', 'y', 'value'):
+                    records[field][:kept_count] = old[field] + take(dtype, kept_count)
+        new = records[kept_count:]
+        for field in ENTITY.names:
+            new[field] = take(ENTITY.fields[field][0], new_count)
+        # New entities have higher serials than old ones, so the order holds;
+        # sort anyway in case a store's serials ever restart
+        if kept_count and new_count and records['serial'][kept_count - 1] > records['serial'][kept_count]:
+            records = records[np.argsort(records['serial'], kind='stable')]
+        entities[name] = records
+    return Snapshot(frame, score, lives, state, (width, height), tuple(player), entities)
+
+
+def apply(snapshot, sim):
+    """Mirror a snapshot into a Simulation (of any playfield size) so it can be drawn"""
+    config = sim.config
+    scale_x = config.width / snapshot.size[0]
+    scale_y = config.height / snapshot.size[1]
+    for name, size in STORES:
+        store = getattr(sim, name)
+        records = snapshot.entities[name]
+        store.clear()
+        width, height = config.sprite_size(*size)
+        if name == 'powerups':
+            slots = store.add_many(records['x'] * scale_x, records['y'] * scale_y, width, height, 0, kind=records['value'])
+        else:
+            slots = store.add_many(records['x'] * scale_x, records['y'] * scale_y, width, height, 0, points=records['value'])
+        # Same serials as on the server, so drawing can follow entities between ticks
+        store.serial[slots] = records['serial']
+    x, y, rapid_fire, speed_boost = snapshot.player
+    player = sim.player
+    player.rect.x = int(x * scale_x)
+    player.rect.y = int(y * scale_y)
+    player.x = float(player.rect.x)
+    player.rapid_fire_timer = rapid_fire
+    player.speed_boost_timer = speed_boost
+    sim.score = snapshot.score
+    sim.lives = snapshot.lives
+    sim.state = snapshot.state
+    sim.events.clear()
@@ -0,0 +1,117 @@
+"""Sprite images at a window size, and the collision masks built from them.
+
+Needs no display: images are decoded but not converted, so the game server,
+balance sweeps and training environments build exactly the masks the game
+itself collides with. Sprites whose files are missing are drawn as simple
+built-in shapes.
+"""
+import pygame
+
+from collision import SpriteMasks
+from prefetch import asset_path
+
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+CYAN = (0, 255, 255)
+
+# Simulation sprite name -> image its collision mask is built from
+MASK_SPRITES = {'player': 'player_img', 'bullet': 'bullet_img', 'enemy_10': 'enemy_img_10',
+                'enemy_30': 'enemy_img_30', 'enemy_50': 'enemy_img_50', 'speed': 'powerup_img',
+                'rapid_fire': 'powerup_img', 'heart': 'heart_powerup_img'}
+
+
+def scale_value(value, is_horizontal, size):
+    return int(value * (size[0] / 800 if is_horizontal else size[1] / 600))
+
+
+def load_image(source, size):
+    """Decode and scale an image file, or None if it is missing or undecodable"""
+    try:
+        return pygame.transform.scale(pygame.image.load(source), size)
+    except (OSError, pygame.error):
+        return None
+
+
+def load_sprites(size, assets=None):
+    """Ship, alien, bullet and powerup surfaces for a window size, not converted.
+
+    With an AssetCache the scaled images come from (and go to) its disk cache.
+    """
+    player_size = (scale_value(50, True, size), scale_value(50, False, size))
+    enemy_size = (scale_value(40, True, size), scale_value(40, False, size))
+    bullet_size = (scale_value(10, True, size), scale_value(20, False, size))
+    powerup_size = (scale_value(30, True, size), scale_value(30, False, size))
+    images = {}
+
+    requests = [
+        ('spaceship', asset_path('spaceship.png'), player_size, True),
+        ('alien1', asset_path('alien1.png'), enemy_size, True),
+        ('alien2', asset_path('alien2.png'), enemy_size, True),
+        ('alien3', asset_path('alien3.png'), enemy_size, True),
+        ('bullet', asset_path('bullet.png'), bullet_size, True),
+        ('powerup', asset_path('powerup.png'), powerup_size, True),
+        ('heart_powerup', asset_path('heart_powerup.png'), powerup_size, True),
+    ]
+    if assets is not None:
+        # Decode and scale every sprite in one batch; cached sizes are a single read each
+        loaded = assets.load_many(requests)
+    else:
+        loaded = {name: load_image(source, image_size) for name, source, image_size, _ in requests}
+
+    # Load player image (spaceship)
+    if loaded['spaceship']:
+        images['player_img'] = loaded['spaceship']
+    else:
+        player_img = pygame.Surface(player_size, pygame.SRCALPHA)
+        pygame.draw.polygon(player_img, BLUE, [(scale_value(25, True, size), 0), (0, player_size[1]), player_size])
+        images['player_img'] = player_img
+
+    # Load enemy images (aliens)
+    if loaded['alien1'] and loaded['alien2'] and loaded['alien3']:
+        images['enemy_img_10'] = loaded['alien1']
+        images['enemy_img_30'] = loaded['alien2']
+        images['enemy_img_50'] = loaded['alien3']
+    else:
+        for name, color in (('enemy_img_10', GREEN), ('enemy_img_30', RED), ('enemy_img_50', BLUE)):
+            enemy_img = pygame.Surface(enemy_size, pygame.SRCALPHA)
+            pygame.draw.circle(enemy_img, color, (enemy_size[0]//2, enemy_size[1]//2), enemy_size[0]//2)
+            images[name] = enemy_img
+
+    # Load bullet image
+    if loaded['bullet']:
+        images['bullet_img'] = loaded['bullet']
+    else:
+        bullet_img = pygame.Surface(bullet_size, pygame.SRCALPHA)
+        pygame.draw.rect(bullet_img, RED, (0, 0, bullet_size[0], bullet_size[1]))
+        images['bullet_img'] = bullet_img
+
+    # Load powerup images
+    if loaded['powerup'] and loaded['heart_powerup']:
+        images['powerup_img'] = loaded['powerup']
+        images['heart_powerup_img'] = loaded['heart_powerup']
+    else:
+        powerup_img = pygame.Surface(powerup_size, pygame.SRCALPHA)
+        pygame.draw.rect(powerup_img, CYAN, (0, 0, powerup_size[0], powerup_size[1]))
+        images['powerup_img'] = powerup_img
+
+        heart_powerup_img = pygame.Surface(powerup_size, pygame.SRCALPHA)
+        pygame.draw.circle(heart_powerup_img, RED, (powerup_size[0]//2, powerup_size[1]//2), powerup_size[0]//2)
+        images['heart_powerup_img'] = heart_powerup_img
+    return images
+
+
+def sprite_masks(images):
+    """SpriteMasks for the simulation from load_sprites() images"""
+    return SpriteMasks.from_images({name: images[image] for name, image in MASK_SPRITES.items()})
+
+
+def config_masks(config):
+    """Masks of the sprites at a GameConfig's playfield size, for headless simulations"""
+    return sprite_masks(load_sprites((config.width, config.height)))
+
+
+if __name__ == "__main__":
+    for name, mask in sprite_masks(load_sprites((800, 600))).masks.items():
+        width, height = mask.get_size()
+        print(f"{name:<11} {width}x{height}, {mask.count() / (width * height):.0%} solid")
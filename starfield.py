@@ -0,0 +1,151 @@
+"""Procedural space backgrounds generated with NumPy.
+
+Drawing thousands of stars with one pygame.draw.circle call each is the
+slowest part of building a background, and it grows with the window area.
+Starfield instead decides every star, nebula and planet detail up front from
+a seed, then stamps all stars of one radius straight into the surface's
+pixels (via surfarray) in a single batch. The handful of nebulae and the
+planet, whose count does not grow with the area, are cached alpha surfaces
+blitted on top. The same description can be rendered as one surface or, for
+very large resolutions, as a sequence of tiles that line up exactly.
+"""
+import numpy as np
+import pygame
+
+WHITE = (255, 255, 255)
+CYAN = (0, 255, 255)
+BRIGHT_YELLOW = (255, 255, 0)
+NEBULA_COLORS = ((20, 0, 40, 50), (0, 20, 40, 50), (40, 0, 20, 50))
+PLANET_COLOR = (150, 100, 50)
+PLANET_DETAIL_COLOR = (120, 80, 40)
+
+_disc_cache = {}
+_nebula_cache = {}
+
+
+def _disc_offsets(radius):
+    """Pixel offsets covered by a filled circle of the given radius"""
+    offsets = _disc_cache.get(radius)
+    if offsets is None:
+        span = np.arange(-radius, radius + 1)
+        dx, dy = np.meshgrid(span, span, indexing='ij')
+        inside = dx * dx + dy * dy <= radius * radius
+        offsets = (dx[inside], dy[inside])
+        _disc_cache[radius] = offsets
+    return offsets
+
+
+def _stamp_discs(pixels, origin, x, y, radius, colors):
+    """Draw filled circles of mapped colors into a 2D pixel array starting at origin"""
+    width, height = pixels.shape
+    for r in np.unique(radius):
+        chosen = radius == r
+        dx, dy = _disc_offsets(int(r))
+        px = x[chosen, None] - origin[0] + dx
+        py = y[chosen, None] - origin[1] + dy
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        color = np.broadcast_to(colors[chosen, None], px.shape)
+        pixels[px[inside], py[inside]] = color[inside]
+
+
+def _nebula(radius, color):
+    """Faint per-pixel-alpha circle, shared between backgrounds"""
+    key = (radius, color)
+    nebula = _nebula_cache.get(key)
+    if nebula is None:
+        nebula = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(nebula, color, (radius, radius), radius)
+        _nebula_cache[key] = nebula
+    return nebula
+
+
+class Starfield:
+    """Seeded layout of stars, nebulae and an optional planet for one background size"""
+    def __init__(self, size, seed=None, star_area=1500, star_radii=(1, 4),
+                 star_colors=(WHITE, CYAN, BRIGHT_YELLOW), nebulae=20, planet=True):
+        self.size = size
+        width, height = size
+        rng = np.random.default_rng(seed)
+
+        # Star density follows the screen area
+        count = int((width * height) / star_area)
+        self.star_x = rng.integers(0, width, count, endpoint=True)
+        self.star_y = rng.integers(0, height, count, endpoint=True)
+        self.star_radius = rng.integers(star_radii[0], star_radii[1], count, endpoint=True)
+        self.star_colors = star_colors
+        self.star_color = rng.integers(len(star_colors), size=count)
+
+        # Nebula-like effects: large, faint circles
+        self.nebula_x = rng.integers(0, width, nebulae, endpoint=True)
+        self.nebula_y = rng.integers(0, height, nebulae, endpoint=True)
+        self.nebula_radius = rng.integers(50, 150, nebulae, endpoint=True)
+        self.nebula_color = rng.integers(len(NEBULA_COLORS), size=nebulae)
+
+        # A planet in the top right with darker surface details (relative to its square)
+        self.planet = None
+        if planet:
+            radius = int(80 * width / 800)
+            center = (width - radius - int(50 * width / 800), int(100 * height / 600))
+            dx = rng.integers(0, radius * 2, 15, endpoint=True)
+            dy = rng.integers(0, radius * 2, 15, endpoint=True)
+            detail_radius = rng.integers(5, 15, 15, endpoint=True)
+            # Details only start inside the planet, but may spill over its edge
+            keep = (dx - radius) ** 2 + (dy - radius) ** 2 < radius * radius
+            self.planet = (center, radius, dx[keep], dy[keep], detail_radius[keep])
+        self._planet_surface = None
+
+    def planet_surface(self):
+        """The planet and its details on a transparent square"""
+        if self._planet_surface is None:
+            (cx, cy), radius, detail_x, detail_y, detail_radius = self.planet
+            planet = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(planet, PLANET_COLOR, (radius, radius), radius)
+            for dx, dy, dr in zip(detail_x, detail_y, detail_radius):
+                pygame.draw.circle(planet, PLANET_DETAIL_COLOR, (int(dx), int(dy)), int(dr))
+            self._planet_surface = planet
+        return self._planet_surface
+
+    def surface(self, rect=None):
+        """Render rect (x, y, width, height) of the background into a new opaque Surface"""
+        if rect is None:
+            rect = (0, 0) + tuple(self.size)
+        x, y, width, height = rect
+        surface = pygame.Surface((width, height), 0, 32)
+
+        # Stars, skipping those that cannot touch this region
+        r = self.star_radius
+        near = ((self.star_x + r >= x) & (self.star_x - r < x + width) &
+                (self.star_y + r >= y) & (self.star_y - r < y + height))
+        palette = np.array([surface.map_rgb(color) for color in self.star_colors], dtype=np.uint32)
+        pixels = pygame.surfarray.pixels2d(surface)
+        _stamp_discs(pixels, (x, y), self.star_x[near], self.star_y[near], r[near],
+                     palette[self.star_color[near]])
+        del pixels  # Unlock the surface before blitting
+
+        for nx, ny, nr, nc in zip(self.nebula_x, self.nebula_y, self.nebula_radius, self.nebula_color):
+            nr = int(nr)
+            surface.blit(_nebula(nr, NEBULA_COLORS[nc]), (nx - nr - x, ny - nr - y))
+
+        if self.planet:
+            (cx, cy), radius = self.planet[:2]
+            surface.blit(self.planet_surface(), (cx - radius - x, cy - radius - y))
+        return surface
+
+    def tiles(self, tile_size=1024):
+        """Yield (rect, Surface) tiles covering the whole background"""
+        width, height = self.size
+        for y in range(0, height, tile_size):
+            for x in range(0, width, tile_size):
+                rect = (x, y, min(tile_size, width - x), min(tile_size, height - y))
+                yield pygame.Rect(rect), self.surface(rect)
+
+
+def menu_background(size, seed=None):
+    """Dense, colorful starfield with nebulae and a planet"""
+    return Starfield(size, seed).surface()
+
+
+def game_background(size, seed=None):
+    """Sparse white starfield used when the background image is unavailable"""
+    return Starfield(size, seed, star_area=5000, star_radii=(1, 3), star_colors=(WHITE,),
+                     nebulae=0, planet=False).surface()
@@ -0,0 +1,206 @@
+"""Batch runner for balance and tuning sweeps.
+
+Plays many headless games for every combination of a parameter grid and
+aggregates the outcomes per combination: win rate, time to victory, lives
+lost and final score. Games are handed out in chunks to a process pool using
+every core, and results are merged and reported while the sweep runs.
+
+Every combination plays the same game seeds, so differences between
+combinations come from the parameters rather than from luck of the draw.
+
+    python sweep.py --games 2000 --policy tracker \\
+        --param target_score=150,250 --param enemy_speeds=2/3/4,3/4/5 \\
+        --param powerup_chance=0.005,0.01 --output sweep.csv
+
+Values are parsed as JSON numbers; enemy_speeds takes the speeds of the
+10/30/50 point enemies separated by slashes.
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+if __name__ == "__main__":
+    # Quiet pygame's banner in the sweep and its workers, which inherit the environment
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from policies import POLICIES
+from simulation import GameConfig, Simulation, VICTORY, GAME_OVER
+from sprites import config_masks
+
+
+def parse_value(name, text):
+    if name == 'enemy_speeds':
+        speeds = [json.loads(speed) for speed in text.split('/')]
+        if len(speeds) != 3:
+            raise ValueError(f"enemy_speeds needs three speeds (10/30/50 points), got {text}")
+        return dict(zip((10, 30, 50), speeds))
+    return json.loads(text)
+
+
+def parse_grid(params):
+    """['name=v1,v2', ...] -> list of config override dicts, one per combination"""
+    names = []
+    choices = []
+    for param in params:
+        name, _, values = param.partition('=')
+        if name not in GameConfig().to_dict():
+            raise ValueError(f"Unknown GameConfig parameter: {name}")
+        names.append(name)
+        choices.append([parse_value(name, value) for value in values.split(',')])
+    return [dict(zip(names, combination)) for combination in itertools.product(*choices)]
+
+
+def game_seed(sweep_seed, game):
+    return sweep_seed * 2 ** 32 + game
+
+
+class Outcome:
+    """Running totals for the games played with one parameter combination"""
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.timeouts = 0
+        self.victory_ticks = 0
+        self.victory_ticks_squared = 0
+        self.lives_lost = 0
+        self.score = 0
+        self.ticks = 0
+
+    def add(self, sim):
+        self.games += 1
+        self.ticks += sim.tick_count
+        self.score += sim.score
+        self.lives_lost += max(sim.config.max_lives - sim.lives, 0)
+        if sim.state == VICTORY:
+            self.wins += 1
+            self.victory_ticks += sim.tick_count
+            self.victory_ticks_squared += sim.tick_count ** 2
+        elif sim.state == GAME_OVER:
+            self.losses += 1
+        else:
+            self.timeouts += 1
+
+    def merge(self, other):
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def summary(self):
+        games = max(self.games, 1)
+        wins = max(self.wins, 1)
+        mean = self.victory_ticks / wins
+        variance = max(self.victory_ticks_squared / wins - mean * mean, 0.0)
+        return {
+            'games': self.games,
+            'win_rate': self.wins / games,
+            'loss_rate': self.losses / games,
+            'timeout_rate': self.timeouts / games,
+            'victory_ticks_mean': mean if self.wins else None,
+            'victory_ticks_std': math.sqrt(variance) if self.wins else None,
+            'lives_lost_mean': self.lives_lost / games,
+            'score_mean': self.score / games,
+        }
+
+
+def play_chunk(point, overrides, policy_name, sweep_seed, first_game, count, max_ticks):
+    """Worker: play games first_game .. first_game + count - 1 for one combination"""
+    config = GameConfig(**overrides)
+    # Collide pixel for pixel, like the game does
+    sim = Simulation(config, masks=config_masks(config))
+    make_policy = POLICIES[policy_name]
+    outcome = Outcome()
+    for game in range(first_game, first_game + count):
+        seed = game_seed(sweep_seed, game)
+        sim.run(make_policy(seed), max_ticks=max_ticks, seed=seed)
+        outcome.add(sim)
+    return point, outcome
+
+
+def sweep(grid, games, policy='random', seed=0, max_ticks=36000, chunk_size=25, workers=None, progress=None):
+    """Play `games` games per combination; returns one Outcome per grid entry.
+
+    progress(done, total, outcomes) is called as chunks finish.
+    """
+    outcomes = [Outcome() for _ in grid]
+    total = games * len(grid)
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(play_chunk, point, overrides, policy, seed, first, min(chunk_size, games - first), max_ticks)
+                   for first in range(0, games, chunk_size)
+                   for point, overrides in enumerate(grid)]
+        for future in as_completed(futures):
+            point, outcome = future.result()
+            outcomes[point].merge(outcome)
+            done += outcome.games
+            if progress:
+                progress(done, total, outcomes)
+    return outcomes
+
+
+def write_results(path, grid, outcomes):
+    rows = []
+    for overrides, outcome in zip(grid, outcomes):
+        row = {name: ('/'.join(str(speed) for speed in value.values()) if name == 'enemy_speeds' else value)
+               for name, value in overrides.items()}
+        row.update(outcome.summary())
+        rows.append(row)
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play headless games across a grid of game parameters")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2',
+                        help="GameConfig parameter and the values to try; repeat for more parameters")
+    parser.add_argument('--games', type=int, default=1000, help="games per combination")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--seed', type=int, default=0, help="sweep seed; games use the same seeds in every combination")
+    parser.add_argument('--max-ticks', type=int, default=36000, help="give up on a game after this many ticks (default 10 minutes)")
+    parser.add_argument('--chunk-size', type=int, default=25, help="games per worker task")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per core)")
+    parser.add_argument('--output', metavar='PATH', help="write per-combination results to PATH (.json or .csv)")
+    args = parser.parse_args(argv)
+
+    grid = parse_grid(args.param)
+    start = time.perf_counter()
+    last_report = [start]
+
+    def progress(done, total, outcomes):
+        now = time.perf_counter()
+        if now - last_report[0] >= 2 or done == total:
+            last_report[0] = now
+            wins = sum(outcome.wins for outcome in outcomes)
+            ticks = sum(outcome.ticks for outcome in outcomes)
+            print(f"{done}/{total} games, {done / (now - start):,.0f} games/s, "
+                  f"{ticks / (now - start):,.0f} ticks/s, overall win rate {wins / done:.1%}", flush=True)
+
+    outcomes = sweep(grid, args.games, args.policy, args.seed, args.max_ticks,
+                     args.chunk_size, args.workers, progress)
+
+    for overrides, outcome in zip(grid, outcomes):
+        summary = outcome.summary()
+        ticks = summary['victory_ticks_mean']
+        tick_rate = GameConfig(**overrides).tick_rate
+        print(f"{json.dumps(overrides) if overrides else 'defaults'}: win {summary['win_rate']:.1%}, "
+              f"lose {summary['loss_rate']:.1%}, timeout {summary['timeout_rate']:.1%}, "
+              f"victory after {f'{ticks / tick_rate:.1f}s' if ticks is not None else '-'}, "
+              f"lives lost {summary['lives_lost_mean']:.2f}, score {summary['score_mean']:.0f}")
+    if args.output:
+        write_results(args.output, grid, outcomes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
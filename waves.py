@@ -0,0 +1,156 @@
+"""Data-driven enemy waves for swarm mode.
+
+A wave script is written as JSON and compiled ahead of time into a compact
+binary file: one fixed-size record (time, x, y, points) per enemy, sorted by
+spawn time. The simulation memory-maps the compiled file and streams
+enemies in as game time passes, so a script can describe hundreds of
+thousands of enemies without building them up front.
+
+Script format (positions are in the 800x600 reference playfield, times in
+seconds):
+
+    {"waves": [
+        {"time": 0, "formation": "grid", "rows": 4, "columns": 12, "points": 10,
+         "spacing": [50, 45], "x": 400, "y": -40, "stagger": 0.02},
+        {"time": 6, "formation": "line", "count": 16, "points": 30, "repeat": 5, "every": 1.5},
+        {"time": 12, "formation": "v", "count": 21, "points": 50},
+        {"time": 20, "formation": "random", "count": 20000, "duration": 15, "points": 10, "seed": 3}
+    ]}
+
+Formations: line (a row across the screen), grid (rows x columns), v (a
+V pointing down), column (one file at x) and random (spread over duration).
+stagger releases a formation's enemies one after another, repeat/every
+sends the same formation again. Points must be an enemy type of the game.
+
+    python waves.py compile waves/swarm.json waves/swarm.waves
+    python waves.py info waves/swarm.waves
+"""
+import json
+import struct
+import sys
+
+import numpy as np
+
+_MAGIC = b'AIWV'
+_VERSION = 1
+# magic, version, event count
+_HEADER = struct.Struct('<4sBI')
+EVENT = np.dtype([('time', '<u4'), ('x', '<f4'), ('y', '<f4'), ('points', '<u2')])
+ENEMY_POINTS = (10, 30, 50)
+ENEMY_WIDTH = 40  # Reference enemy size, used to keep formations on screen
+
+
+def _formation(wave):
+    """Enemy offsets (x, y) of one formation, relative to its anchor"""
+    kind = wave.get('formation', 'line')
+    if kind == 'line':
+        count = wave.get('count', 10)
+        spacing = wave.get('spacing', 760 / max(count, 1))
+        x = (np.arange(count) - (count - 1) / 2) * spacing
+        return x, np.zeros(count)
+    if kind == 'grid':
+        rows, columns = wave.get('rows', 3), wave.get('columns', 10)
+        dx, dy = wave.get('spacing', (50, 50))
+        x, y = np.meshgrid((np.arange(columns) - (columns - 1) / 2) * dx, -np.arange(rows) * dy)
+        return x.ravel(), y.ravel()
+    if kind == 'v':
+        count = wave.get('count', 11)
+        dx, dy = wave.get('spacing', (30, 25))
+        arm = np.arange(count) - count // 2
+        return arm * dx, -np.abs(arm) * dy
+    if kind == 'column':
+        count = wave.get('count', 10)
+        return np.zeros(count), -np.arange(count) * wave.get('spacing', 50)
+    raise ValueError(f"Unknown formation: {kind}")
+
+
+def compile_script(script):
+    """Wave script (parsed JSON) -> sorted EVENT array"""
+    parts = []
+    for wave in script['waves']:
+        points = wave.get('points', 10)
+        if points not in ENEMY_POINTS:
+            raise ValueError(f"Enemies are worth {ENEMY_POINTS} points, not {points}")
+        start = wave.get('time', 0.0)
+        y0 = wave.get('y', -40)
+        if wave.get('formation') == 'random':
+            rng = np.random.default_rng(wave.get('seed', 0))
+            count = wave.get('count', 100)
+            times = start + np.sort(rng.random(count)) * wave.get('duration', 10)
+            x = rng.uniform(0, 800 - ENEMY_WIDTH, count)
+            y = np.full(count, float(y0))
+        else:
+            dx, dy = _formation(wave)
+            x = np.clip(wave.get('x', 400) + dx - ENEMY_WIDTH / 2, 0, 800 - ENEMY_WIDTH)
+            y = y0 + dy
+            times = start + np.arange(len(x)) * wave.get('stagger', 0.0)
+        for repeat in range(wave.get('repeat', 1)):
+            events = np.zeros(len(x), dtype=EVENT)
+            events['time'] = np.round((times + repeat * wave.get('every', 1.0)) * 1000)
+            events['x'] = x
+            events['y'] = y
+            events['points'] = points
+            parts.append(events)
+    events = np.concatenate(parts) if parts else np.zeros(0, dtype=EVENT)
+    return events[np.argsort(events['time'], kind='stable')]
+
+
+def save(path, events):
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(events)))
+        f.write(events.tobytes())
+
+
+def load(path):
+    """Spawn events from a compiled .waves file (memory-mapped) or a JSON script"""
+    if path.endswith('.json'):
+        with open(path) as f:
+            return compile_script(json.load(f))
+    with open(path, 'rb') as f:
+        magic, version, count = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"{path} is not a version {_VERSION} wave file")
+    if count == 0:
+        return np.zeros(0, dtype=EVENT)
+    return np.memmap(path, dtype=EVENT, mode='r', offset=_HEADER.size, shape=(count,))
+
+
+class WaveScript:
+    """Spawn events of a script plus where they came from"""
+    def __init__(self, path):
+        self.path = path
+        self.events = load(path)
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def duration(self):
+        """Seconds until the last enemy is released"""
+        return self.events['time'][-1] / 1000 if len(self.events) else 0.0
+
+    def due(self, start, now_ms):
+        """Index range [start, stop) of the events due by now_ms"""
+        return start, int(np.searchsorted(self.events['time'], now_ms, side='right'))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 3 and argv[0] == 'compile':
+        with open(argv[1]) as f:
+            events = compile_script(json.load(f))
+        save(argv[2], events)
+        print(f"{argv[2]}: {len(events)} enemies over {events['time'][-1] / 1000 if len(events) else 0:.1f}s, "
+              f"{_HEADER.size + events.nbytes} bytes")
+    elif len(argv) == 2 and argv[0] == 'info':
+        script = WaveScript(argv[1])
+        counts = {points: int((script.events['points'] == points).sum()) for points in ENEMY_POINTS}
+        print(f"{argv[1]}: {len(script)} enemies over {script.duration:.1f}s, by points {counts}")
+    else:
+        print("usage: python waves.py compile SCRIPT.json OUT.waves | info FILE")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())